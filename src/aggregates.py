@@ -0,0 +1,197 @@
+import os
+import sqlite3
+import numpy as np
+from models import VOCAB, long_word_rows
+
+# Bump when what a post contributes changes without its content changing (e.g. the tokenizer), so old caches are rebuilt
+AGGREGATES_VERSION = 2
+
+# One row per topic, holding the topic's watermark when it was folded in and what stats need from each of its posts as
+# packed columns, one entry per post in (time, load_id) order. The author column indexes the category's author list
+# and long word ids index the cache's own vocab table, so a topic row never has to be rewritten unless its posts change.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS vocab (id INTEGER PRIMARY KEY, word TEXT);
+CREATE TABLE IF NOT EXISTS categories (category TEXT PRIMARY KEY, authors TEXT);
+CREATE TABLE IF NOT EXISTS topics (
+    category TEXT, topic TEXT, posts INTEGER, last INTEGER, digest INTEGER,
+    keys BLOB, author BLOB, time BLOB, words BLOB, chars BLOB, lw_word BLOB, lw_post BLOB,
+    PRIMARY KEY (category, topic)
+);
+"""
+# keys are the posts' hashes, which tell the same post in two topics apart from two posts
+COLUMNS = ["keys", "author", "time", "words", "chars"]
+
+
+def empty_columns():
+    return {name: np.zeros(0, dtype=np.int64) for name in COLUMNS}, np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.uint32)
+
+
+class categoryAggregate:
+    # The packed post columns of one category's topics, one topic after another. topic_ids gives the order, bounds and
+    # lw_bounds the post rows and long word rows of each, and watermarks the Topic.watermark they were built for.
+    def __init__(self):
+        self.authors = []  # author load_ids, indexed by the author column
+        self.author_ids = {}
+        self.topic_ids = []
+        self.watermarks = {}
+        self.bounds = np.zeros(1, dtype=np.int64)
+        self.lw_bounds = np.zeros(1, dtype=np.int64)
+        self.columns, self.lw_word, self.lw_post = empty_columns()  # lw_post is the post's row within its topic
+        # what changed since the last save
+        self.changed = set()
+        self.removed = set()
+        self.new_authors = True
+
+    def author_id(self, load_id):
+        if load_id not in self.author_ids:
+            self.author_ids[load_id] = len(self.authors)
+            self.authors.append(load_id)
+            self.new_authors = True
+        return self.author_ids[load_id]
+
+    def topic_rows(self, position):
+        return slice(self.bounds[position], self.bounds[position + 1])
+
+    def update(self, topics, seen_authors):
+        # Rebuilds the topics whose watermark moved since they were folded in and drops the ones no longer in the
+        # category; untouched topics keep their rows and their posts are never looked at. Returns the rebuilt topics.
+        current = {t.load_id: t for t in topics}
+        stale = [t for t in current.values() if self.watermarks.get(t.load_id) != t.watermark()]
+        gone = self.watermarks.keys() - current.keys()
+        if not stale and not gone:
+            return stale
+        rebuilt = {t.load_id for t in stale} | gone
+        keep = np.array([load_id not in rebuilt for load_id in self.topic_ids], dtype=bool)
+        counts, lw_counts = np.diff(self.bounds), np.diff(self.lw_bounds)
+        row_keep, lw_keep = np.repeat(keep, counts), np.repeat(keep, lw_counts)
+
+        posts = [sorted(t.posts, key=lambda p: (p.timestamp, p.load_id)) for t in stale]
+        flat = [p for topic_posts in posts for p in topic_posts]
+        for p in flat:
+            seen_authors.setdefault(p.author.load_id, p.author)
+        new = {
+            "keys": [p.hash for p in flat],
+            "author": [self.author_id(p.author.load_id) for p in flat],
+            "time": [p.timestamp for p in flat],
+            "words": [p.word_count for p in flat],
+            "chars": [p.char_count for p in flat],
+        }
+        new_counts = np.array([len(topic_posts) for topic_posts in posts], dtype=np.int64)
+        starts = np.concatenate(([0], np.cumsum(new_counts)))
+        lw_word, owners = long_word_rows(flat)
+        # owners are rows of the batch, stored as rows within each post's own topic
+        owner_topic = np.searchsorted(starts, owners, side="right") - 1
+        new_lw_counts = np.bincount(owner_topic, minlength=len(stale))
+
+        self.columns = {name: np.concatenate((self.columns[name][row_keep], np.array(new[name], dtype=np.int64))) for name in COLUMNS}
+        self.lw_word = np.concatenate((self.lw_word[lw_keep], lw_word))
+        self.lw_post = np.concatenate((self.lw_post[lw_keep], (owners - starts[owner_topic]).astype(np.uint32)))
+        self.bounds = np.concatenate(([0], np.cumsum(np.concatenate((counts[keep], new_counts)))))
+        self.lw_bounds = np.concatenate(([0], np.cumsum(np.concatenate((lw_counts[keep], new_lw_counts)))))
+        self.topic_ids = [load_id for load_id, kept in zip(self.topic_ids, keep) if kept] + [t.load_id for t in stale]
+        for load_id in gone:
+            del self.watermarks[load_id]
+        self.watermarks.update((t.load_id, t.watermark()) for t in stale)
+        self.changed.update(t.load_id for t in stale)
+        self.changed -= gone
+        self.removed |= gone
+        return stale
+
+
+class aggregateCache:
+    # Per-category packed post columns that statsEngine builds its tables from. With a path they are kept in SQLite
+    # between runs, and an update only rebuilds the topics that gained, lost or changed posts since the last one.
+    def __init__(self, path=None):
+        self.path = path
+        self.categories = {}  # category load_id -> categoryAggregate
+        # live Author objects for turning load_ids back into what the leaderboards show
+        self.authors = {}
+        self.vocab = []  # cache word id -> VOCAB id
+        self.vocab_ids = {}  # VOCAB id -> cache word id
+        self.saved_vocab = 0
+        if path is not None and os.path.exists(path):
+            self.load()
+
+    def update(self, categories, authors=None):
+        # authors are the run's Author objects; without them the authors of untouched topics are found through their posts
+        if authors is not None:
+            self.authors.update((a.load_id, a) for a in authors)
+        topics, folded = 0, 0
+        for c in categories:
+            aggregate = self.categories.setdefault(c.load_id, categoryAggregate())
+            stale = aggregate.update(c.topics, self.authors)
+            topics += len(stale)
+            folded += sum(len(t.posts) for t in stale)
+            if authors is None and any(load_id not in self.authors for load_id in aggregate.authors):
+                for t in c.topics:
+                    for p in t.posts:
+                        self.authors.setdefault(p.author.load_id, p.author)
+        print(f"Aggregates: {folded} posts of {topics} new or changed topics folded in.")
+        if self.path is not None:
+            self.save()
+
+    def load(self):
+        conn = sqlite3.connect(self.path)
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != AGGREGATES_VERSION:
+            print(f"Aggregate cache version {version} does not match {AGGREGATES_VERSION}, rebuilding it.")
+            conn.close()
+            os.remove(self.path)
+            return
+        self.vocab = [VOCAB.intern(word) for (word,) in conn.execute("SELECT word FROM vocab ORDER BY id")]
+        self.vocab_ids = {word_id: i for i, word_id in enumerate(self.vocab)}
+        self.saved_vocab = len(self.vocab)
+        to_vocab = np.array(self.vocab, dtype=np.uint32)
+        for category, authors in conn.execute("SELECT category, authors FROM categories"):
+            a = self.categories[category] = categoryAggregate()
+            a.new_authors = False
+            a.authors = authors.split(",") if authors else []
+            a.author_ids = {load_id: i for i, load_id in enumerate(a.authors)}
+            rows = conn.execute(
+                "SELECT topic, posts, last, digest, keys, author, time, words, chars, lw_word, lw_post FROM topics WHERE category = ?", (category,)
+            ).fetchall()
+            a.topic_ids = [row[0] for row in rows]
+            a.watermarks = {row[0]: (row[1], row[2], row[3]) for row in rows}
+            a.bounds = np.concatenate(([0], np.cumsum([row[1] for row in rows], dtype=np.int64)))
+            a.lw_bounds = np.concatenate(([0], np.cumsum([len(row[9]) // 4 for row in rows], dtype=np.int64)))
+            for i, name in enumerate(COLUMNS):
+                a.columns[name] = np.frombuffer(b"".join(row[4 + i] for row in rows), dtype=np.int64)
+            a.lw_word = to_vocab[np.frombuffer(b"".join(row[9] for row in rows), dtype=np.uint32)]
+            a.lw_post = np.frombuffer(b"".join(row[10] for row in rows), dtype=np.uint32)
+        conn.close()
+
+    def cache_words(self, word_ids):
+        # VOCAB ids as ids of the cache's vocab table, adding the words it does not have yet
+        for word_id in np.unique(word_ids).tolist():
+            if word_id not in self.vocab_ids:
+                self.vocab_ids[word_id] = len(self.vocab)
+                self.vocab.append(word_id)
+        lookup = np.zeros(len(VOCAB.words), dtype=np.uint32)
+        lookup[self.vocab] = np.arange(len(self.vocab), dtype=np.uint32)
+        return lookup[word_ids]
+
+    def save(self):
+        conn = sqlite3.connect(self.path)
+        conn.executescript(SCHEMA)
+        for category, a in self.categories.items():
+            if a.new_authors:
+                conn.execute("INSERT OR REPLACE INTO categories VALUES (?, ?)", (category, ",".join(a.authors)))
+            conn.executemany("DELETE FROM topics WHERE category = ? AND topic = ?", ((category, load_id) for load_id in a.removed))
+            rows = []
+            lw_word = self.cache_words(a.lw_word) if a.changed else None
+            for position, load_id in enumerate(a.topic_ids):
+                if load_id not in a.changed:
+                    continue
+                posts, lw = a.topic_rows(position), slice(a.lw_bounds[position], a.lw_bounds[position + 1])
+                rows.append(
+                    (category, load_id, *a.watermarks[load_id])
+                    + tuple(a.columns[name][posts].tobytes() for name in COLUMNS)
+                    + (lw_word[lw].tobytes(), a.lw_post[lw].tobytes())
+                )
+            conn.executemany("INSERT OR REPLACE INTO topics VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            a.changed, a.removed, a.new_authors = set(), set(), False
+        conn.executemany("INSERT INTO vocab VALUES (?, ?)", ((i, VOCAB.words[w]) for i, w in enumerate(self.vocab) if i >= self.saved_vocab))
+        self.saved_vocab = len(self.vocab)
+        conn.execute(f"PRAGMA user_version = {AGGREGATES_VERSION}")
+        conn.commit()
+        conn.close()
@@ -1,23 +1,260 @@
 import os
+import glob
 import json
-from string import Formatter
-from bs4 import BeautifulSoup
-from models import Category, Topic, Post, Author
-
-
-def save_data(categories, topics, posts, authors, file_name="scraped_data.txt"):
-    data = {
-        "categories": [category.__getstate__() for category in categories],
-        "topics": [topic.__getstate__() for topic in topics],
-        "posts": [post.__getstate__() for post in posts],
-        "authors": [author.__getstate__() for author in authors.values()],
-    }
-    with open(file_name, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=4)
+import mmap
+import uuid
+import sqlite3
+import threading
+from array import array
+from models import Category, Topic, Post, Author, VOCAB
+
+SNAPSHOT_VERSION = 4
+
+# Posts, topics, authors and categories are stored as tables with integer foreign keys. The many-to-many style sets on
+# the models are kept as link tables so a load gives back exactly the sets that were saved. Post word counts are stored
+# as the same parallel word id / count arrays the posts hold in memory, with ids pointing into the vocab table. Post
+# text lives outside the database in a content file, which the meta table names, with an offset and length per post.
+SCHEMA = """
+CREATE TABLE categories (id INTEGER PRIMARY KEY, load_id TEXT, title TEXT, url TEXT);
+CREATE TABLE authors (id INTEGER PRIMARY KEY, load_id TEXT, name TEXT, url TEXT);
+CREATE TABLE topics (
+    id INTEGER PRIMARY KEY, load_id TEXT, category_id INTEGER, author_id INTEGER, title TEXT, url TEXT, marker TEXT, pages TEXT
+);
+CREATE TABLE posts (
+    id INTEGER PRIMARY KEY,
+    load_id TEXT,
+    topic_id INTEGER,
+    author_id INTEGER,
+    category_id INTEGER,
+    timestamp INTEGER,
+    content_offset INTEGER,
+    content_length INTEGER,
+    pre_compute_done INTEGER,
+    word_count INTEGER,
+    char_count INTEGER,
+    word_ids BLOB,
+    word_counts BLOB
+);
+CREATE TABLE vocab (id INTEGER PRIMARY KEY, word TEXT);
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE category_topics (category_id INTEGER, topic_id INTEGER);
+CREATE TABLE topic_posts (topic_id INTEGER, post_id INTEGER);
+CREATE TABLE author_posts (author_id INTEGER, post_id INTEGER);
+CREATE TABLE author_threads (author_id INTEGER, topic_id INTEGER);
+"""
+
+
+class contentFile:
+    # Post text of a snapshot, one file of UTF-8 bytes. It is only opened, and memory-mapped rather than read, the first
+    # time some post's text is asked for, so runs that only need pre-computed word counts never touch it.
+    def __init__(self, path):
+        self.path = path
+        self.map = None
+        self.lock = threading.Lock()
+
+    def raw(self, offset, length):
+        with self.lock:
+            if self.map is None:
+                with open(self.path, "rb") as f:
+                    self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+        return self.map[offset : offset + length]
+
+    def text(self, offset, length):
+        return self.raw(offset, length).decode("utf-8")
+
+
+def remove_stale_content(file_name, keep):
+    # Content files of earlier saves. One still mapped can not be removed on Windows, the next save tries again.
+    for path in glob.glob(f"{glob.escape(file_name)}.*.content"):
+        if path != keep:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def save_data(categories, topics, posts, authors, file_name="scraped_data.db"):
+    categories, topics, posts, authors = list(categories), list(topics), list(posts), list(authors.values())
+    if not all(post.has_content() for post in posts):
+        raise ValueError("Posts were loaded without content, saving them would drop it from the snapshot.")
+    category_ids = {c.load_id: i for i, c in enumerate(categories)}
+    topic_ids = {t.load_id: i for i, t in enumerate(topics)}
+    post_ids = {p.load_id: i for i, p in enumerate(posts)}
+    author_ids = {a.load_id: i for i, a in enumerate(authors)}
+
+    def pack(values):
+        return values.tobytes() if values is not None else None
+
+    def ref(ids, obj):
+        return ids[obj.load_id] if obj is not None else None
+
+    # Post text goes to a content file named for this save. It is written before the snapshot naming it is swapped in,
+    # so the snapshot on disk always has its content file, old or new.
+    content_name = f"{file_name}.{uuid.uuid4().hex[:12]}.content"
+    spans = []
+    with open(content_name, "wb") as f:
+        offset = 0
+        for p in posts:
+            body = p.content_bytes()
+            f.write(body)
+            spans.append((offset, len(body)))
+            offset += len(body)
+
+    # Write to a temporary file and swap it in, so an interrupted save never leaves a half-written snapshot behind
+    tmp_name = f"{file_name}.tmp"
+    if os.path.exists(tmp_name):
+        os.remove(tmp_name)
+    conn = sqlite3.connect(tmp_name)
+    conn.executescript(SCHEMA)
+    conn.executemany("INSERT INTO categories VALUES (?, ?, ?, ?)", ((i, c.load_id, c.title, c.url) for i, c in enumerate(categories)))
+    conn.executemany("INSERT INTO authors VALUES (?, ?, ?, ?)", ((i, a.load_id, a.name, a.url) for i, a in enumerate(authors)))
+    conn.executemany(
+        "INSERT INTO topics VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (
+            (i, t.load_id, ref(category_ids, t.category), ref(author_ids, t.author), t.title, t.url, t.marker, json.dumps(t.pages, sort_keys=True))
+            for i, t in enumerate(topics)
+        ),
+    )
+    conn.executemany(
+        "INSERT INTO posts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (
+            (
+                i,
+                p.load_id,
+                ref(topic_ids, p.topic),
+                ref(author_ids, p.author),
+                ref(category_ids, p.category),
+                p.timestamp,
+                *spans[i],
+                p.pre_compute_done,
+                p.word_count,
+                p.char_count,
+                pack(p.word_ids),
+                pack(p.word_counts),
+            )
+            for i, p in enumerate(posts)
+        ),
+    )
+    conn.executemany("INSERT INTO vocab VALUES (?, ?)", enumerate(VOCAB.words))
+    conn.execute("INSERT INTO meta VALUES ('content_file', ?)", (os.path.basename(content_name),))
+    conn.executemany("INSERT INTO category_topics VALUES (?, ?)", ((i, topic_ids[t.load_id]) for i, c in enumerate(categories) for t in c.topics))
+    conn.executemany("INSERT INTO topic_posts VALUES (?, ?)", ((i, post_ids[p.load_id]) for i, t in enumerate(topics) for p in t.posts))
+    conn.executemany("INSERT INTO author_posts VALUES (?, ?)", ((i, post_ids[p.load_id]) for i, a in enumerate(authors) for p in a.posts))
+    conn.executemany("INSERT INTO author_threads VALUES (?, ?)", ((i, topic_ids[t.load_id]) for i, a in enumerate(authors) for t in a.new_threads))
+    conn.execute(f"PRAGMA user_version = {SNAPSHOT_VERSION}")
+    conn.commit()
+    conn.close()
+    os.replace(tmp_name, file_name)
+
+    # Every post now reads its text from the new content file, which frees the text of freshly scraped posts as well
+    contents = contentFile(content_name)
+    for p, (offset, length) in zip(posts, spans):
+        p.content_ref = (contents, offset, length)
+        p._content = None
+    remove_stale_content(file_name, content_name)
     print("Data saved successfully.")
 
 
-def load_data(file_name="scraped_data.txt"):
+def load_data(file_name="scraped_data.db", content=True, legacy_file_name="scraped_data.txt"):
+    # Post.content is read from the content file only when asked for. content=False leaves it as None instead, for
+    # runs that must not need it.
+    if not os.path.exists(file_name):
+        if os.path.exists(legacy_file_name):
+            print("Found a JSON backup, converting it to the snapshot format.")
+            values = load_json(legacy_file_name)
+            save_data(*values, file_name=file_name)
+            return values
+        return False
+    print("File found. Loading data from backup.")
+    conn = sqlite3.connect(file_name)
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version != SNAPSHOT_VERSION:
+        print(f"Snapshot version {version} does not match {SNAPSHOT_VERSION}, ignoring it.")
+        conn.close()
+        return False
+
+    (content_file,) = conn.execute("SELECT value FROM meta WHERE key = 'content_file'").fetchone()
+    contents = contentFile(os.path.join(os.path.dirname(file_name), content_file)) if content else None
+
+    categories = [
+        Category(title, url, load_id=load_id) for load_id, title, url in conn.execute("SELECT load_id, title, url FROM categories ORDER BY id")
+    ]
+    authors_by_id = [Author(name, url, load_id=load_id) for load_id, name, url in conn.execute("SELECT load_id, name, url FROM authors ORDER BY id")]
+    topics = [
+        Topic(
+            categories[category_id],
+            title,
+            url,
+            author=authors_by_id[author_id] if author_id is not None else None,
+            load_id=load_id,
+            marker=marker,
+            pages=json.loads(pages),
+        )
+        for load_id, category_id, author_id, title, url, marker, pages in conn.execute(
+            "SELECT load_id, category_id, author_id, title, url, marker, pages FROM topics ORDER BY id"
+        )
+    ]
+    # Snapshot word ids are mapped onto the in-memory vocabulary, which is a no-op when it starts out empty
+    id_map = array("I", map(VOCAB.intern, (word for (word,) in conn.execute("SELECT word FROM vocab ORDER BY id"))))
+    remap = any(word_id != i for i, word_id in enumerate(id_map))
+
+    def unpack(blob, remap=False):
+        if blob is None:
+            return None
+        values = array("I")
+        values.frombytes(blob)
+        return array("I", map(id_map.__getitem__, values)) if remap else values
+
+    posts = []
+    for (
+        load_id,
+        topic_id,
+        author_id,
+        category_id,
+        timestamp,
+        content_offset,
+        content_length,
+        pre_compute_done,
+        word_count,
+        char_count,
+        word_ids,
+        word_counts,
+    ) in conn.execute(
+        "SELECT load_id, topic_id, author_id, category_id, timestamp, content_offset, content_length, pre_compute_done, word_count, "
+        "char_count, word_ids, word_counts FROM posts ORDER BY id"
+    ):
+        post = Post(
+            topics[topic_id],
+            authors_by_id[author_id],
+            None,
+            None,
+            category=categories[category_id] if category_id is not None else None,
+            load_id=load_id,
+            pre_compute_done=bool(pre_compute_done),
+            word_count=word_count,
+            timestamp=timestamp,
+        )
+        post.set_words(unpack(word_ids, remap), unpack(word_counts), char_count)
+        if contents is not None:
+            post.content_ref = (contents, content_offset, content_length)
+        posts.append(post)
+    for category_id, topic_id in conn.execute("SELECT category_id, topic_id FROM category_topics"):
+        categories[category_id].topics.add(topics[topic_id])
+    for topic_id, post_id in conn.execute("SELECT topic_id, post_id FROM topic_posts"):
+        topics[topic_id].add_post(posts[post_id])
+    for author_id, post_id in conn.execute("SELECT author_id, post_id FROM author_posts"):
+        authors_by_id[author_id].posts.add(posts[post_id])
+    for author_id, topic_id in conn.execute("SELECT author_id, topic_id FROM author_threads"):
+        authors_by_id[author_id].new_threads.add(topics[topic_id])
+    conn.close()
+
+    authors = {author.name: author for author in authors_by_id}
+    print("Data loaded successfully.")
+    return categories, topics, posts, authors
+
+
+def load_json(file_name="scraped_data.txt"):
+    # Reader for the old indent=4 JSON backups, only used to convert them
     if os.path.exists(file_name):
         print("File found. Loading data from backup.")
         with open(file_name, "r", encoding="utf-8") as f:
@@ -26,7 +263,9 @@ def load_data(file_name="scraped_data.txt"):
         # Reconstruct objects. Use load_id to restore associations later
         categories = {category["load_id"]: Category(category["title"], category["url"], topics=category["topics"]) for category in data["categories"]}
         topics = {
-            topic["load_id"]: Topic(topic["category"], topic["title"], topic["url"], author=topic["author"], posts=topic["posts"])
+            topic["load_id"]: Topic(
+                topic["category"], topic["title"], topic["url"], author=topic["author"], marker=topic.get("marker"), pages=topic.get("pages", ())
+            )
             for topic in data["topics"]
         }
         posts = {
@@ -51,9 +290,11 @@ def load_data(file_name="scraped_data.txt"):
         # Restore associations using load_id
         for category in categories.values():
             category.topics = set(topics[load_id] for load_id in category.topics)
+        for topic in data["topics"]:
+            for load_id in topic["posts"]:
+                topics[topic["load_id"]].add_post(posts[load_id])
         for topic in topics.values():
             topic.category = categories[topic.category]
-            topic.posts = set(posts[load_id] for load_id in topic.posts)
             topic.author = authors_by_id[topic.author]
         for post in posts.values():
             post.topic = topics[post.topic]
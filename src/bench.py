@@ -0,0 +1,1196 @@
+import os
+import sys
+import time
+import asyncio
+import json
+import argparse
+import random
+import platform
+import subprocess
+import tempfile
+import gzip
+import hashlib
+import datetime
+import tracemalloc
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import requests
+import numpy as np
+from collections import Counter, defaultdict
+import parse
+from backup import load_data, load_json, save_data
+import stats
+from stats import TOPIC_PRINT_LEN, calculate_stats, longest_words, nice_format, print_stats, render_pages, top_rows, rank_in, author_order
+from report import reportWriter
+from stats_engine import statsEngine, top_k, name_ranks
+from aggregates import aggregateCache
+from jinja2 import Environment, FileSystemLoader
+from models import Author, leaderboard, tokenize, pre_compute_posts, vocabulary, parse_time, day_start, EPOCH, FORUM_TIME_FORMAT
+from pagestore import open_store, migrate_backup_dir, migrate_if_needed, pageStore, _stores
+from journal import crawlJournal
+from scraper import crawl, crawl_async, parse_store, parse_stored_pages, scrapeTracker, pageWrapper
+from frontier import crawlFrontier, HIGH, LOW
+from synthetic import syntheticForum
+from fetcher import fetch_page, configure_session
+from metrics import METRICS
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+FORUM_ORIGIN = "https://apda.online"
+
+
+class storeHandler(BaseHTTPRequestHandler):
+    # Serves the saved pages as if they were apda.online, sleeping `latency` seconds per request. Connections are kept
+    # alive, pages carry an ETag and Last-Modified and are gzipped when asked for, and with fail_every every that many
+    # requests get a 503 instead. Requests and body bytes sent are counted in `sent`.
+    protocol_version = "HTTP/1.1"
+    # headers and body go out in separate writes, Nagle would hold the body back for a delayed ACK
+    disable_nagle_algorithm = True
+    store = None
+    latency = 0.0
+    fail_every = None
+    sent = None
+    lock = threading.Lock()
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        with self.lock:
+            self.sent["requests"] += 1
+            fail = self.fail_every and self.sent["requests"] % self.fail_every == 0
+        if fail:
+            self.reply(503, b"<html><body>Service Unavailable</body></html>")
+            return
+        text = self.store.get(FORUM_ORIGIN + self.path)
+        if text is None:
+            self.reply(404, b"<html><body>Not Found</body></html>")
+            return
+        body = text.encode("utf-8")
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        headers = {"ETag": etag, "Last-Modified": "Mon, 01 Jan 2024 00:00:00 GMT"}
+        if self.headers.get("If-None-Match") == etag:
+            self.reply(304, b"", headers)
+            return
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body, 6)
+            headers["Content-Encoding"] = "gzip"
+        self.reply(200, body, headers)
+
+    def reply(self, status, body, headers={}):
+        with self.lock:
+            self.sent["bytes"] += len(body)
+            self.sent[status] = self.sent.get(status, 0) + 1
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_store(store_path="backup.db", latency=0.0, fail_every=None):
+    handler = type(
+        "handler",
+        (storeHandler,),
+        {"store": open_store(store_path), "latency": latency, "fail_every": fail_every, "sent": {"requests": 0, "bytes": 0}},
+    )
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class localSession(requests.Session):
+    # Sends requests for apda.online to the stand-in server while the crawler keeps seeing the real URLs
+    def __init__(self, origin):
+        super().__init__()
+        self.origin = origin
+
+    def request(self, method, url, *args, **kwargs):
+        return super().request(method, url.replace(FORUM_ORIGIN, self.origin), *args, **kwargs)
+
+
+class legacySession(localSession):
+    # The fetches the crawler used to make: no validators and no compression, so every page comes back in full
+    def request(self, method, url, *args, headers=None, **kwargs):
+        headers = {k: v for k, v in (headers or {}).items() if k not in ("If-None-Match", "If-Modified-Since")}
+        headers["Accept-Encoding"] = "identity"
+        return super().request(method, url, *args, headers=headers, **kwargs)
+
+
+def new_data():
+    return {"categories": {}, "topics": {}, "posts": {}, "authors": {"deleted": Author("deleted", None)}}
+
+
+def data_ids(data):
+    return {k: set(v) for k, v in data.items()}
+
+
+def data_fields(data):
+    # Every persisted field of every object, for comparing two crawls of the same pages
+    return {k: sorted(str(sorted(o.__getstate__().items())) for o in v.values()) for k, v in data.items()}
+
+
+def data_graph(data):
+    # data_fields without the order of the lists sets are saved as, which a concurrent crawl fills in completion order
+    return {
+        k: sorted(str(sorted((f, sorted(x) if isinstance(x, list) else x) for f, x in o.__getstate__().items())) for o in v.values())
+        for k, v in data.items()
+    }
+
+
+def bench_crawl(store_path="backup.db", latency=0.05, concurrency_levels=(1, 4, 8, 16), per_host=8, rps=None):
+    server = serve_store(store_path, latency)
+    origin = f"http://127.0.0.1:{server.server_port}"
+    baseline = None
+    print(f"Crawl benchmark: {latency * 1000:.0f}ms injected latency, per-host cap {per_host}, rps limit {rps}")
+    try:
+        for concurrency in concurrency_levels:
+            data = new_data()
+            tracker = scrapeTracker()
+            with tempfile.TemporaryDirectory() as cache_dir, open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+                cache_path = os.path.join(cache_dir, "cache.db")
+                start = time.perf_counter()
+                session = localSession(origin)
+                if concurrency == 1:
+                    crawl(session, data, tracker, store_path=cache_path)
+                else:
+                    asyncio.run(crawl_async(session, data, tracker, concurrency=concurrency, per_host=per_host, rps=rps, store_path=cache_path))
+                elapsed = time.perf_counter() - start
+                open_store(cache_path).close()
+            ids = data_ids(data)
+            baseline = baseline or ids
+            match = "same data" if ids == baseline else "DATA MISMATCH"
+            print(
+                f"  concurrency {concurrency:>3}: {tracker.from_web:>6} pages in {elapsed:8.2f}s ({tracker.from_web / elapsed:8.1f} pages/s) {match}"
+            )
+    finally:
+        server.shutdown()
+
+
+def bench_store(backup_dir="backup"):
+    files = [os.path.join(backup_dir, f) for f in os.listdir(backup_dir) if f.endswith(".html")]
+    raw_size = sum(os.path.getsize(f) for f in files)
+    with tempfile.TemporaryDirectory() as tmp:
+        store_path = os.path.join(tmp, "pages.db")
+        store = pageStore(store_path)
+        start = time.perf_counter()
+        migrate_backup_dir(store, backup_dir)
+        migrate_time = time.perf_counter() - start
+        store.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        store_size = os.path.getsize(store_path)
+
+        start = time.perf_counter()
+        for f in files:
+            with open(f, "r", encoding="utf-8") as file:
+                file.read()
+        dir_time = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in store.bodies():
+            pass
+        store_time = time.perf_counter() - start
+        store.close()
+    mb = raw_size / 1e6
+    print(f"Page store benchmark: {len(files)} pages, {mb:.1f} MB of html")
+    print(f"  backup/ directory: {raw_size / 1e6:8.1f} MB, read {len(files) / dir_time:10.0f} pages/s ({mb / dir_time:7.1f} MB/s)")
+    print(f"  page store:        {store_size / 1e6:8.1f} MB, read {len(files) / store_time:10.0f} pages/s ({mb / store_time:7.1f} MB/s)")
+    print(f"  compression ratio {raw_size / store_size:.2f}x, migration took {migrate_time:.2f}s")
+
+
+def bench_parse(store_path="backup.db", backends=("html.parser", "lxml")):
+    store = open_store(store_path)
+    texts = list(store.bodies())
+    mb = sum(len(t) for t in texts) / 1e6
+    print(f"Parse benchmark: {len(texts)} cached pages, {mb:.1f} MB of html")
+    records = {}
+    for backend in backends:
+        start = time.perf_counter()
+        records[backend] = [parse.extract(text, backend) for text in texts]
+        elapsed = time.perf_counter() - start
+        print(f"  {backend:>12}: {len(texts) / elapsed:8.1f} pages/s ({mb / elapsed:6.2f} MB/s)")
+    reference = backends[0]
+    for backend in backends[1:]:
+        mismatched = sum(a != b for a, b in zip(records[reference], records[backend]))
+        print(f"  {backend} records matching {reference}: {len(texts) - mismatched}/{len(texts)}")
+
+    # Golden check: crawling the cache with each backend must build the same Category/Topic/Post/Author graph
+    graphs = {}
+    for backend in backends:
+        parse.PARSER = backend
+        data = new_data()
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            crawl(None, data, scrapeTracker(), store_path=store_path)
+        graphs[backend] = data_fields(data)
+    for backend in backends[1:]:
+        same = graphs[backend] == graphs[reference]
+        print(f"  {backend} object graph {'identical to' if same else 'DIFFERS FROM'} {reference}")
+
+
+def bench_rebuild(store_path="backup.db", worker_counts=(2, 4, 8)):
+    print(f"Rebuild benchmark: {len(open_store(store_path))} cached pages, {os.cpu_count()} cores")
+    graphs = {}
+    for workers in (1,) + tuple(worker_counts):
+        data = new_data()
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            start = time.perf_counter()
+            parsed = parse_store(store_path, workers) if workers > 1 else None
+            crawl(None, data, scrapeTracker(), store_path=store_path, parsed=parsed)
+            elapsed = time.perf_counter() - start
+        graphs[workers] = data_fields(data)
+        match = "same graph" if graphs[workers] == graphs[1] else "GRAPH MISMATCH"
+        print(f"  {'serial' if workers == 1 else f'{workers} workers':>10}: {elapsed:8.2f}s {match}")
+
+
+class stopCrawl(Exception):
+    pass
+
+
+class stoppingTracker(scrapeTracker):
+    # Cuts the crawl short after `limit` pages, as a crash or Ctrl-C would
+    def __init__(self, limit):
+        super().__init__()
+        self.limit = limit
+
+    def count(self, from_web):
+        if self.scraped >= self.limit:
+            raise stopCrawl()
+        super().count(from_web)
+
+
+def bench_resume(store_path="backup.db", checkpoint_every=50, latency=0.01):
+    # Crawls cut off halfway and resumed from the journal against uninterrupted crawls, serially from the page store
+    # and concurrently over HTTP
+    server = serve_store(store_path, latency)
+    origin = f"http://127.0.0.1:{server.server_port}"
+
+    def run(mode, data, tracker, journal, cache_path):
+        if mode == "serial":
+            crawl(None, data, tracker, store_path=store_path, journal=journal)
+        else:
+            asyncio.run(crawl_async(localSession(origin), data, tracker, concurrency=8, per_host=8, store_path=cache_path, journal=journal))
+
+    try:
+        for mode in ["serial", "concurrent"]:
+            with tempfile.TemporaryDirectory() as tmp, open(os.devnull, "w") as devnull:
+                full, tracker = new_data(), scrapeTracker()
+                with redirect_stdout(devnull):
+                    start = time.perf_counter()
+                    run(mode, full, tracker, None, os.path.join(tmp, "full.db"))
+                    full_time = time.perf_counter() - start
+                pages = tracker.scraped
+
+                journal_path, cache_path = os.path.join(tmp, "journal.db"), os.path.join(tmp, "cache.db")
+                journal = crawlJournal(journal_path, checkpoint_every=checkpoint_every)
+                with redirect_stdout(devnull):
+                    try:
+                        run(mode, new_data(), stoppingTracker(pages // 2), journal, cache_path)
+                    except stopCrawl:
+                        pass
+                # Whatever was appended after the last checkpoint is lost, as it would be in a crash
+                journal.conn.close()
+
+                resumed, tracker = new_data(), scrapeTracker()
+                journal = crawlJournal(journal_path, checkpoint_every=checkpoint_every)
+                with redirect_stdout(devnull):
+                    start = time.perf_counter()
+                    run(mode, resumed, tracker, journal, cache_path)
+                    resume_time = time.perf_counter() - start
+                journal.finish()
+                for path in (os.path.join(tmp, "full.db"), cache_path):
+                    if path in _stores:
+                        open_store(path).close()
+            same = data_graph(resumed) == data_graph(full)
+            print(
+                f"  {mode:>10}: {pages} pages, uninterrupted {full_time:6.2f}s, resumed after {pages // 2} pages {resume_time:6.2f}s, same graph: {same}"
+            )
+    finally:
+        server.shutdown()
+
+
+def bench_snapshot(file_name="scraped_data.db"):
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        categories, topics, posts, authors = load_data(file_name)
+    print(f"Snapshot benchmark: {len(posts)} posts, {len(topics)} topics, {len(authors)} authors")
+    with tempfile.TemporaryDirectory() as tmp:
+        json_name = os.path.join(tmp, "scraped_data.txt")
+        db_name = os.path.join(tmp, "scraped_data.db")
+        timings = {}
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            # The JSON backup as it used to be written
+            start = time.perf_counter()
+            data = {
+                "categories": [c.__getstate__() for c in categories],
+                "topics": [t.__getstate__() for t in topics],
+                "posts": [p.__getstate__() for p in posts],
+                "authors": [a.__getstate__() for a in authors.values()],
+            }
+            for post in data["posts"]:
+                post["words"] = dict(post["words"]) if post["words"] is not None else None
+            for topic in data["topics"]:
+                topic["pages"] = list(topic["pages"])
+            with open(json_name, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=4)
+            timings["save json"] = time.perf_counter() - start
+            del data
+            start = time.perf_counter()
+            save_data(categories, topics, posts, authors, file_name=db_name)
+            timings["save snapshot"] = time.perf_counter() - start
+            for name, load in (
+                ("load json", lambda: load_json(json_name)),
+                ("load snapshot", lambda: load_data(db_name)),
+                ("load snapshot without content", lambda: load_data(db_name, content=False)),
+            ):
+                start = time.perf_counter()
+                load()
+                timings[name] = time.perf_counter() - start
+        print(f"  json:     {os.path.getsize(json_name) / 1e6:8.1f} MB")
+        print(f"  snapshot: {os.path.getsize(db_name) / 1e6:8.1f} MB")
+    for name, elapsed in timings.items():
+        print(f"  {name:>30}: {elapsed:8.2f}s")
+
+
+def legacy_tokenize(content):
+    # Post.pre_compute before the single-pass tokenizer, kept to check and time against
+    chars = set("?/!-.,\":;\'()[]{}<>/\\|@#$%^&*_+=~`")
+    replace_chars = ["\n", "\\n", "\t", "\\t", "\r", "\\r"] + list(chars) + ["   ", "  "]
+    content = content.lower()
+    words = content.split()
+    words = [word for word in words if "https" not in word and ".com" not in word]
+    content = " ".join(words)
+    for char in replace_chars:
+        content = content.replace(char, " ")
+    return Counter(content.split())
+
+
+def bench_tokenize(file_name="scraped_data.db"):
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        posts = load_data(file_name)[2]
+    contents = [post.content for post in posts]
+    print(f"Tokenizer benchmark: {len(contents)} posts, {sum(len(c) for c in contents) / 1e6:.1f}M characters")
+    results = {}
+    for name, func in (("legacy", legacy_tokenize), ("single pass", tokenize)):
+        start = time.perf_counter()
+        results[name] = [func(content) for content in contents]
+        elapsed = time.perf_counter() - start
+        tokens = sum(sum(words.values()) for words in results[name])
+        print(f"  {name:>12}: {tokens / elapsed:12,.0f} tokens/s ({elapsed:.2f}s)")
+    mismatched = sum(a != b for a, b in zip(results["legacy"], results["single pass"]))
+    print(f"  posts with different word counts: {mismatched}")
+
+
+def bench_pre_compute(file_name="scraped_data.db", worker_counts=(1, 2, 4, 8)):
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        posts = list(load_data(file_name)[2])
+    tokens = None
+    print(f"Pre-compute benchmark: {len(posts)} posts, {os.cpu_count()} cores")
+    for workers in worker_counts:
+        for post in posts:
+            post.pre_compute_done, post.words, post.word_count = False, None, None
+        start = time.perf_counter()
+        pre_compute_posts(posts, workers=workers)
+        elapsed = time.perf_counter() - start
+        counts = [post.word_count for post in posts]
+        tokens = tokens or counts
+        match = "same counts" if counts == tokens else "COUNT MISMATCH"
+        print(f"  {workers:>2} workers: {sum(counts) / elapsed:12,.0f} tokens/s ({elapsed:.2f}s) {match}")
+
+
+def bench_vocab(file_name="scraped_data.db"):
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        posts = list(load_data(file_name)[2])
+        pre_compute_posts(posts)
+    print(f"Vocabulary benchmark: {len(posts)} posts")
+    layouts = {}
+    for name in ("Counter per post", "interned arrays"):
+        tracemalloc.start()
+        if name == "Counter per post":
+            # Fresh strings per post, as tokenizing or loading each post used to produce
+            layout = [Counter({"".join(word): count for word, count in post.words.items()}) for post in posts]
+        else:
+            vocab = vocabulary()
+            layout = [vocab.encode(post.words) for post in posts]
+            layout = (vocab, layout)
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        layouts[name] = layout
+        print(f"  {name:>18}: {current / 1e6:8.1f} MB held, {peak / 1e6:8.1f} MB peak")
+
+    start = time.perf_counter()
+    counter_chars = sum(len(w) * c for words in layouts["Counter per post"] for w, c in words.items())
+    counter_time = time.perf_counter() - start
+    vocab, encoded = layouts["interned arrays"]
+    start = time.perf_counter()
+    array_chars = sum(vocab.char_count(word_ids, word_counts) for word_ids, word_counts in encoded)
+    array_time = time.perf_counter() - start
+    start = time.perf_counter()
+    post_chars = sum(post.char_count for post in posts)
+    post_time = time.perf_counter() - start
+    print(f"  character total over Counters: {counter_time:.3f}s, over arrays: {array_time:.3f}s, equal: {counter_chars == array_chars}")
+    print(f"  character total from per-post char_count (what calculate_stats uses): {post_time:.4f}s, equal: {post_chars == counter_chars}")
+
+
+VIEWS = [{}, {"exclude_categories": ["Fun & Games"]}, {"include_categories": ["General"]}]
+
+
+def bench_stats(file_name="scraped_data.db"):
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        categories, topics, posts, authors = load_data(file_name)
+        pre_compute_posts(posts)
+    print(f"Stats benchmark: {len(posts)} posts, {len(topics)} topics, {len(authors)} authors, {len(VIEWS)} views")
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        start = time.perf_counter()
+        reference = [calculate_stats(categories, **view) for view in VIEWS]
+        reference_time = time.perf_counter() - start
+        start = time.perf_counter()
+        engine = statsEngine(categories)
+        build_time = time.perf_counter() - start
+        start = time.perf_counter()
+        vectorized = engine.calculate_views(VIEWS)
+        view_time = time.perf_counter() - start
+    print(f"  calculate_stats: {reference_time:8.3f}s")
+    print(f"  statsEngine:     {build_time + view_time:8.3f}s ({build_time:.3f}s building tables, {view_time:.3f}s for the views)")
+    mismatched = 0
+    for ref, vec in zip(reference, vectorized):
+        mismatched += ref["summary"] != vec["summary"]
+        for ref_board, vec_board in zip(ref["leaderboards"], vec["leaderboards"]):
+            mismatched += ref_board.data != vec_board.data
+            # rank lookups agree with the position of every shown row
+            column = 2 if ref_board.title == "Longest Words" else 0
+            for position, row in enumerate(vec_board.data, 1):
+                mismatched += ref_board.rank(row[column]) != position or vec_board.rank(row[column]) != position
+    print(f"  leaderboards or summaries that differ: {mismatched}")
+
+    # Extra views only add masked sums over the shared tables
+    titles = [c.title for c in categories if c.topics]
+    many_views = VIEWS + [{"exclude_categories": [title]} for title in titles] + [{"include_categories": [title]} for title in titles]
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        start = time.perf_counter()
+        engine.calculate_views(many_views)
+        many_time = time.perf_counter() - start
+    print(f"  {len(many_views)} views: {many_time:.3f}s, {many_time / len(many_views) * 1000:.1f}ms per view")
+
+
+def legacy_long_words(posts):
+    # The Longest Words rows calculate_stats used to build: every long word of every post as a string, links for
+    # all of them, then a full sort
+    w_by_p = defaultdict(set)
+    for p in posts:
+        for w in p.words.keys():
+            if len(w) > 10:
+                w_by_p[w].add(p)
+    rows = [
+        [
+            ", ".join(f'<a href="{p.author.url}"> {p.author.name} </a>' for p in p_list),
+            ", ".join(f'<a href="{p.topic.url}"> {p.topic.title} </a>' for p in p_list),
+            w,
+            len(w),
+        ]
+        for w, p_list in w_by_p.items()
+    ]
+    return sorted(rows, key=lambda x: (-x[3], x[2]))
+
+
+def bench_long_words(file_name="scraped_data.db"):
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        categories, topics, posts, authors = load_data(file_name)
+        pre_compute_posts(posts)
+    views = []
+    for view in VIEWS:
+        include, exclude = view.get("include_categories", []), view.get("exclude_categories", [])
+        chosen = [c for c in categories if (c.title in include if include else c.title not in exclude)]
+        views.append({p for c in chosen for t in c.topics for p in t.posts})
+    print(f"Long words benchmark: {len(posts)} posts, {len(views)} views")
+
+    start = time.perf_counter()
+    legacy = [legacy_long_words(view_posts) for view_posts in views]
+    legacy_time = time.perf_counter() - start
+    start = time.perf_counter()
+    top = [longest_words(view_posts, TOPIC_PRINT_LEN)[0] for view_posts in views]
+    word_id_time = time.perf_counter() - start
+    # The stats engine reads its long words off the aggregates' long word rows
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        start = time.perf_counter()
+        engine_views = statsEngine(categories).calculate_views(VIEWS)
+        engine_time = time.perf_counter() - start
+    engine_boards = [next(b for b in view["leaderboards"] if b.title == "Longest Words") for view in engine_views]
+    print(f"  w_by_p scan and sort per view:  {legacy_time:8.3f}s")
+    print(f"  word id pass per view:          {word_id_time:8.3f}s")
+    print(f"  statsEngine, every leaderboard: {engine_time:8.3f}s")
+    same = all(
+        [row[2] for row in rows[:TOPIC_PRINT_LEN]] == [row[2] for row in view_top] == [row[2] for row in board.data]
+        for rows, view_top, board in zip(legacy, top, engine_boards)
+    )
+    print(f"  same words: {same}")
+
+
+def bench_top_k(sizes=(1000, 10000, 100000, 1000000), k=25):
+    # One leaderboard over n authors with many tied values: the old full sort that formatted every row, the heap used
+    # by calculate_stats, and numpy's partition used by statsEngine. Plus one rank lookup against a full sort.
+    print(f"Top-K benchmark: top {k} rows")
+    rng = random.Random(0)
+    for n in sizes:
+        authors = [Author(f"user{i}", f"https://apda.online/profile/user{i}/") for i in range(n)]
+        rows = [[a, rng.randint(0, max(n // 100, 1))] for a in authors]
+
+        start = time.perf_counter()
+        ordered = sorted(rows, key=lambda row: (-row[1], author_order(row[0])))
+        formatted = [[nice_format(item) for item in row] for row in ordered]
+        sort_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        top = top_rows(rows, k, author_order)
+        shown = [[nice_format(item) for item in row] for row in top]
+        heap_time = time.perf_counter() - start
+
+        values = np.array([row[1] for row in rows])
+        start = time.perf_counter()
+        ties = name_ranks([author_order(a) for a in authors])
+        tie_time = time.perf_counter() - start
+        start = time.perf_counter()
+        partition = [rows[i] for i in top_k(values, k, ties)]
+        numpy_time = time.perf_counter() - start
+
+        probe = authors[n // 2]
+        start = time.perf_counter()
+        rank = rank_in(rows, author_order)(probe)
+        rank_time = time.perf_counter() - start
+        same = shown == formatted[:k] and partition == top and ordered[rank - 1][0] is probe
+        print(
+            f"  {n:8d} authors: full sort {sort_time:7.3f}s, heap {heap_time:7.3f}s, numpy {numpy_time:7.4f}s "
+            f"(+{tie_time:.3f}s for tie ranks), rank lookup {rank_time:.3f}s, same rows: {same}"
+        )
+
+
+def legacy_render(template_name, output_file, root="web/pages/", **context):
+    # render_to_file before the shared environment: a new Environment per page and nice_format applied in place
+    for l in context.get("leaderboards", []):
+        for i, row in enumerate(l.data):
+            for j, item in enumerate(row):
+                l.data[i][j] = nice_format(item)
+    env = Environment(loader=FileSystemLoader("web/templates"))
+    output = env.get_template(template_name).render(**context)
+    with open(f"{root}{output_file}", "w", encoding="utf8") as f:
+        f.write(output)
+
+
+def bench_render(file_name="scraped_data.db", copies=10):
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        categories, topics, posts, authors = load_data(file_name)
+        pre_compute_posts(posts)
+        views = statsEngine(categories).calculate_views(VIEWS)
+    pages = [
+        dict(
+            template_name="stats.html", output_file=f"view{i}_{n}.html", title=f"View {i}", summary=view["summary"], leaderboards=view["leaderboards"]
+        )
+        for n in range(copies)
+        for i, view in enumerate(views)
+    ]
+    print(f"Render benchmark: {len(pages)} pages")
+    with tempfile.TemporaryDirectory() as tmp:
+        stats.RENDER_CACHE_DIR = os.path.join(tmp, "cache")
+        legacy_root, root = os.path.join(tmp, "legacy") + os.sep, os.path.join(tmp, "pages") + os.sep
+        os.makedirs(legacy_root)
+        os.makedirs(root)
+        start = time.perf_counter()
+        for page in pages:
+            legacy_page = dict(
+                page, leaderboards=[leaderboard(l.title, l.headers, [list(row) for row in l.data], l.PRINT_LEN) for l in page["leaderboards"]]
+            )
+            legacy_render(root=legacy_root, **legacy_page)
+        legacy_time = time.perf_counter() - start
+
+        timings = []
+        for label in ["cold", "bytecode cached", "unchanged"]:
+            if label != "unchanged":
+                for name in os.listdir(root):
+                    os.remove(os.path.join(root, name))
+                stats._manifest = None
+            stats._environment = None
+            for page in pages:
+                for l in page["leaderboards"]:
+                    l.formatted = None
+            with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+                start = time.perf_counter()
+                render_pages([dict(page, root=root) for page in pages])
+                timings.append((label, time.perf_counter() - start))
+        same = all(
+            open(os.path.join(legacy_root, name), encoding="utf8").read() == open(os.path.join(root, name), encoding="utf8").read()
+            for name in os.listdir(root)
+        )
+    print(f"  new Environment per page, in place formatting: {legacy_time:7.3f}s")
+    for label, seconds in timings:
+        print(f"  render_pages, {label + ':':36s} {seconds:7.3f}s")
+    print(f"  same pages: {same}")
+
+
+def bench_aggregates(file_name="scraped_data.db", new_posts=20):
+    # Builds the aggregate cache from a snapshot with the newest posts of a few topics held back, then loads the full
+    # snapshot again and times folding those posts in against building the aggregates from scratch
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        categories, topics, posts, authors = load_data(file_name)
+        pre_compute_posts(posts)
+    held_back = sorted(posts, key=lambda p: p.timestamp)[-new_posts:]
+    print(f"Aggregates benchmark: {len(posts)} posts, {len(held_back)} of them arriving after the cache was built")
+    for post in held_back:
+        post.topic.remove_post(post)
+    with tempfile.TemporaryDirectory() as tmp, open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        cache_path = os.path.join(tmp, "stats_cache.db")
+        start = time.perf_counter()
+        statsEngine(categories, aggregateCache(cache_path))
+        build_time = time.perf_counter() - start
+
+        categories, topics, posts, authors = load_data(file_name)
+        pre_compute_posts(posts)
+        start = time.perf_counter()
+        cache = aggregateCache(cache_path)
+        load_time = time.perf_counter() - start
+        start = time.perf_counter()
+        cached = statsEngine(categories, cache)
+        update_time = time.perf_counter() - start
+        # a run with nothing new, which only loads the cache and builds the tables from it
+        start = time.perf_counter()
+        statsEngine(categories, aggregateCache(cache_path))
+        unchanged_time = time.perf_counter() - start
+        start = time.perf_counter()
+        fresh = statsEngine(categories)
+        fresh_time = time.perf_counter() - start
+        cached_views, fresh_views = cached.calculate_views(VIEWS), fresh.calculate_views(VIEWS)
+    print(f"  first build (written to disk): {build_time:8.3f}s")
+    print(f"  loading the cache:             {load_time:8.3f}s")
+    print(f"  incremental update and tables: {update_time:8.3f}s")
+    print(f"  unchanged run (load + tables): {unchanged_time:8.3f}s")
+    print(f"  tables without a cache:        {fresh_time:8.3f}s")
+    mismatched = 0
+    for a, b in zip(cached_views, fresh_views):
+        mismatched += a["summary"] != b["summary"]
+        mismatched += sum(x.data != y.data for x, y in zip(a["leaderboards"], b["leaderboards"]))
+    print(f"  leaderboards or summaries differing from a fresh build: {mismatched}")
+
+
+def bench_report(file_name="scraped_data.db", repeat=5):
+    # print_stats under redirect_stdout against reportWriter (which also writes the JSON and CSV) for the 3 views main
+    # writes, with every leaderboard's display copy rebuilt on each run
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        categories, topics, posts, authors = load_data(file_name)
+        pre_compute_posts(posts)
+        views = statsEngine(categories).calculate_views(VIEWS)
+    titles = [f"View {i}" for i in range(len(views))]
+    print(f"Report benchmark: {len(views)} views, {sum(len(view['leaderboards']) for view in views)} leaderboards")
+
+    def legacy(tmp):
+        with open(os.path.join(tmp, "legacy.txt"), "w", encoding="utf8") as f, redirect_stdout(f):
+            for view, title in zip(views, titles):
+                print_stats(view, title)
+
+    def streamed(tmp):
+        with reportWriter(os.path.join(tmp, "report.txt"), os.path.join(tmp, "report.json"), os.path.join(tmp, "report.csv")) as report:
+            for view, title in zip(views, titles):
+                report.write_stats(view, title)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, write in [("print_stats, redirected stdout", legacy), ("reportWriter, text + JSON + CSV", streamed)]:
+            best = None
+            for _ in range(repeat):
+                for view in views:
+                    for l in view["leaderboards"]:
+                        l.formatted = None
+                start = time.perf_counter()
+                write(tmp)
+                best = min(best or float("inf"), time.perf_counter() - start)
+            tracemalloc.start()
+            write(tmp)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"  {name:32s} {best:7.3f}s, {peak / 1e6:6.1f} MB peak")
+        same = open(os.path.join(tmp, "legacy.txt"), encoding="utf8").read() == open(os.path.join(tmp, "report.txt"), encoding="utf8").read()
+    print(f"  same text: {same}")
+
+
+def bench_timestamps(file_name="scraped_data.db", repeat=5):
+    # Parsing the forum's date text with strptime, as every post did when scraped or loaded, against parse_time, then
+    # loading the snapshot (which now stores epoch seconds) and working out every topic's time span both ways
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        categories, topics, posts, authors = load_data(file_name)
+    texts = [post.datetime.strftime(FORUM_TIME_FORMAT) for post in posts]
+    print(f"Timestamp benchmark: {len(texts)} posts, {len({text.rsplit(',', 1)[0] for text in texts})} distinct days")
+
+    def best(func):
+        elapsed = float("inf")
+        for _ in range(repeat):
+            day_start.cache_clear()
+            start = time.perf_counter()
+            result = func()
+            elapsed = min(elapsed, time.perf_counter() - start)
+        return elapsed, result
+
+    strptime_time, parsed = best(lambda: [int((datetime.datetime.strptime(text, FORUM_TIME_FORMAT) - EPOCH).total_seconds()) for text in texts])
+    parse_time_time, fast = best(lambda: [parse_time(text) for text in texts])
+    print(f"  strptime per post:    {strptime_time:7.3f}s")
+    print(f"  parse_time:           {parse_time_time:7.3f}s, same times: {parsed == fast == [post.timestamp for post in posts]}")
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        load_time, _ = best(lambda: load_data(file_name))
+    print(f"  load snapshot:        {load_time:7.3f}s, where strptime per post would add {strptime_time:.3f}s")
+
+    def sorted_span(topic):
+        times = sorted(post.datetime for post in topic.posts)
+        return (times[-1] - times[0]).total_seconds() if len(times) > 1 else 0
+
+    sort_time, sorted_spans = best(lambda: [sorted_span(topic) for topic in topics])
+    span_time, spans = best(lambda: [topic.time_span() for topic in topics])
+    print(f"  topic spans, sorting each topic's posts: {sort_time:7.4f}s, kept first/last: {span_time:7.4f}s, same: {sorted_spans == spans}")
+
+
+class legacyObject:
+    # A model laid out as before __slots__: fields in a __dict__, the hash parsed from the hex load_id on every call
+    def __eq__(self, other):
+        return isinstance(other, legacyObject) and self.load_id == other.load_id
+
+    def __hash__(self):
+        return int(self.load_id, 16)
+
+
+def legacy_copy(obj):
+    copy = legacyObject()
+    for cls in type(obj).__mro__:
+        for k in getattr(cls, "__slots__", ()):
+            if k != "hash":
+                setattr(copy, k, getattr(obj, k))
+    return copy
+
+
+def bench_models(file_name="scraped_data.db", repeat=5):
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        categories, topics, posts, authors = load_data(file_name)
+    objects = {"Category": list(categories), "Topic": list(topics), "Post": list(posts), "Author": list(authors.values())}
+    print(f"Models benchmark: {', '.join(f'{len(objs)} {name}' for name, objs in objects.items())}")
+    # Size of the objects themselves, fields they point to are shared by both layouts and left out
+    for name, objs in objects.items():
+        slotted = sum(map(sys.getsizeof, objs)) / len(objs)
+        legacy = sum(sys.getsizeof(o) + sys.getsizeof(o.__dict__) for o in map(legacy_copy, objs)) / len(objs)
+        print(f"  {name:>8}: {legacy:6.0f} bytes with a __dict__, {slotted:6.0f} bytes with __slots__")
+
+    posts = objects["Post"]
+    for name, objs in [("__dict__, int(load_id, 16) hash", [legacy_copy(p) for p in posts]), ("__slots__, cached hash", posts)]:
+        build, lookup = float("inf"), float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            members = set(objs)
+            build = min(build, time.perf_counter() - start)
+            start = time.perf_counter()
+            found = sum(1 for o in objs if o in members)
+            lookup = min(lookup, time.perf_counter() - start)
+        print(f"  {name:32s} set of posts: {build * 1e3:7.2f}ms, {len(objs) / lookup / 1e6:6.2f}M lookups/s, all found: {found == len(objs)}")
+
+
+def content_run(file_name, mode):
+    # One load + stats run in a fresh process, returning its time, peak RSS and whether the content file was mapped
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        categories, topics, posts, authors = load_data(file_name, content=mode != "content=False")
+        held = [post.content for post in posts] if mode == "every post's text in memory" else None
+        pre_compute_posts(posts)
+        statsEngine(categories).calculate_views(VIEWS)
+    mapped = any(post.content_ref is not None and post.content_ref[0].map is not None for post in posts)
+    return time.perf_counter() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, mapped
+
+
+def bench_content(file_name="scraped_data.db"):
+    # Peak RSS of loading the snapshot and computing the stats views, with post text left in the content file, with
+    # every post's text held in memory as load_data used to, and with content=False
+    print(f"Content benchmark: {os.path.getsize(file_name) / 1e6:.1f} MB snapshot")
+    for mode in ["lazy content", "every post's text in memory", "content=False"]:
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+            elapsed, peak, mapped = executor.submit(content_run, file_name, mode).result()
+        print(f"  {mode:28s} {elapsed:6.2f}s, {peak / 1024:7.1f} MB peak RSS, content file mapped: {mapped}")
+
+
+def bench_fetch(store_path="backup.db", latency=0.02, fail_every=7):
+    # A refresh crawl, and a revalidation of every cached page, against the stand-in server: with the old unconditional
+    # uncompressed fetches and with the fetcher's conditional gzipped ones. Then a crawl against a server failing every
+    # fail_every-th request, which retries should ride out without any error page reaching the cache.
+    server = serve_store(store_path, latency)
+    origin = f"http://127.0.0.1:{server.server_port}"
+    sent = server.RequestHandlerClass.sent
+    print(f"Fetch benchmark: {len(open_store(store_path))} pages, {latency * 1000:.0f}ms injected latency")
+    try:
+        with tempfile.TemporaryDirectory() as tmp, open(os.devnull, "w") as devnull:
+            # a first crawl into an empty cache, the fetcher's run is kept as the cache the refreshes start from
+            for name, session in [
+                ("unconditional, uncompressed", legacySession(origin)),
+                ("conditional, gzip", configure_session(localSession(origin))),
+            ]:
+                cache_path, data = os.path.join(tmp, f"{len(name)}.db"), new_data()
+                sent.clear()
+                sent.update(requests=0, bytes=0)
+                with redirect_stdout(devnull):
+                    start = time.perf_counter()
+                    crawl(session, data, scrapeTracker(), store_path=cache_path)
+                    elapsed = time.perf_counter() - start
+                print(
+                    f"  {name:28s} {'first crawl':22s} {sent['requests']:>5} requests, {'':>19} {sent['bytes'] / 1e6:8.2f} MB sent, {elapsed:6.2f}s"
+                )
+            urls = [url for (url,) in open_store(cache_path).conn.execute("SELECT url FROM pages")]
+
+            for name, make in [("unconditional, uncompressed", legacySession), ("conditional, gzip", lambda o: configure_session(localSession(o)))]:
+                for kind in ["refresh crawl", "revalidate every page"]:
+                    session, tracker = make(origin), scrapeTracker()
+                    sent.clear()
+                    sent.update(requests=0, bytes=0)
+                    with redirect_stdout(devnull):
+                        start = time.perf_counter()
+                        if kind == "refresh crawl":
+                            crawl(session, data, tracker, store_path=cache_path, refresh=True)
+                        else:
+                            for url in urls:
+                                fetch_page(session, url, cache_path, tracker)
+                        elapsed = time.perf_counter() - start
+                    print(
+                        f"  {name:28s} {kind:22s} {sent['requests']:>5} requests, {sent.get(304, 0):>5} not modified, "
+                        f"{sent['bytes'] / 1e6:8.2f} MB sent, {elapsed:6.2f}s"
+                    )
+            open_store(cache_path).close()
+    finally:
+        server.shutdown()
+
+    server = serve_store(store_path, latency, fail_every=fail_every)
+    try:
+        with tempfile.TemporaryDirectory() as tmp, open(os.devnull, "w") as devnull:
+            cache_path = os.path.join(tmp, "cache.db")
+            flaky, tracker = new_data(), scrapeTracker()
+            with redirect_stdout(devnull):
+                crawl(configure_session(localSession(f"http://127.0.0.1:{server.server_port}"), backoff=0.01), flaky, tracker, store_path=cache_path)
+            cached_errors = sum("Service Unavailable" in body for body in open_store(cache_path).bodies())
+            open_store(cache_path).close()
+        sent = server.RequestHandlerClass.sent
+        print(
+            f"  1 in {fail_every} requests failing: {sent.get(503, 0)} retried, {len(tracker.failed)} pages failed, "
+            f"{cached_errors} error pages cached, same data: {data_ids(flaky) == data_ids(data)}"
+        )
+    finally:
+        server.shutdown()
+
+
+def bench_windows(file_name="scraped_data.db", repeat=3):
+    # Per-window author and topic totals for the trailing and monthly windows: a full pass over every post per window,
+    # as a fresh calculate_stats per window would make, against range queries on the timestamp-sorted post index
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        categories, topics, posts, authors = load_data(file_name)
+        pre_compute_posts(posts)
+        engine = statsEngine(categories)
+    start = time.perf_counter()
+    index = engine.time_index()
+    build = time.perf_counter() - start
+    windows = engine.time_windows()
+    n_authors, n_topics = len(engine.authors), len(engine.topics)
+    print(f"Windows benchmark: {len(index.time)} posts, {len(windows)} windows, post index built in {build:.3f}s")
+
+    def full_pass():
+        for _, _, s, e in windows:
+            rows = np.flatnonzero((index.time >= s) & (index.time < e))
+            yield np.bincount(index.author[rows], weights=index.words[rows], minlength=n_authors)
+            yield np.bincount(index.topic[rows], weights=index.words[rows], minlength=n_topics)
+
+    def ranges():
+        for _, _, s, e in windows:
+            rows = np.concatenate([np.arange(lo, hi) for lo, hi in index.ranges(s, e)])
+            yield np.bincount(index.author[rows], weights=index.words[rows], minlength=n_authors)
+            yield np.bincount(index.topic[rows], weights=index.words[rows], minlength=n_topics)
+
+    results = {}
+    for name, run in [("full pass per window", full_pass), ("sorted index ranges", ranges)]:
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            results[name] = list(run())
+            best = min(best or float("inf"), time.perf_counter() - start)
+        print(f"  {name:24s} {best:8.3f}s")
+    same = all(np.array_equal(a, b) for a, b in zip(*results.values()))
+    start = time.perf_counter()
+    engine.calculate_windows(windows)
+    print(f"  every leaderboard of every window: {time.perf_counter() - start:.3f}s, same totals: {same}")
+
+
+def legacy_frontier(start, links):
+    # The crawl's old queues: lists popped from the front, with duplicates only dropped as they come off the queue
+    seen, queue_high, queue_low = set(), [start], []
+    peak = 0
+    while queue_high or queue_low:
+        page = queue_high.pop(0) if queue_high else queue_low.pop(0)
+        if page in seen:
+            continue
+        seen.add(page)
+        new_high, new_low = links(page)
+        new_high -= seen
+        new_low -= seen
+        queue_high.extend(new_high)
+        queue_low.extend(new_low)
+        peak = max(peak, len(queue_high) + len(queue_low))
+    return [p.url for p in seen], peak
+
+
+def frontier_crawl(start, links):
+    frontier = crawlFrontier()
+    frontier.push(start, HIGH)
+    order = []
+    while len(frontier):
+        page, _ = frontier.pop()
+        order.append(page.url)
+        new_high, new_low = links(page)
+        frontier.extend(new_high, HIGH, page.depth + 1)
+        frontier.extend(new_low, LOW, page.depth + 1)
+    return order, frontier.peak
+
+
+def bench_frontier(topic_counts=(1000, 10000, 50000), pages_per_topic=12, topics_per_listing=20, legacy_limit=10000):
+    # Link structure of a large forum without any fetching or parsing: listings link every listing page and their
+    # topics, and every page of a topic links every other page of it, as the forum's pagination does
+    print(f"Frontier benchmark: {pages_per_topic} pages per topic, every topic page linking all of them")
+    for topics in topic_counts:
+        listings = [f"https://forum.test/forum/?part={i}" for i in range((topics + topics_per_listing - 1) // topics_per_listing)]
+
+        def links(page):
+            if page.topic is None:
+                i = listings.index(page.url) if page.url in listings else 0
+                first = i * topics_per_listing
+                found = {pageWrapper(f"https://forum.test/topic/{t}/", topic=t) for t in range(first, min(first + topics_per_listing, topics))}
+                return {pageWrapper(url) for url in listings}, found
+            base = f"https://forum.test/topic/{page.topic}/"
+            return set(), {pageWrapper(base if n == 1 else f"{base}?part={n}", topic=page.topic) for n in range(1, pages_per_topic + 1)}
+
+        timings = []
+        # the old queues are quadratic, past legacy_limit topics they would take hours
+        for name, run in [("lists, dedup on dequeue", legacy_frontier), ("crawlFrontier, dedup on enqueue", frontier_crawl)][topics > legacy_limit :]:
+            start = time.perf_counter()
+            order, peak = run(pageWrapper(listings[0]), links)
+            timings.append((name, time.perf_counter() - start, peak, len(order)))
+        for name, seconds, peak, pages in timings:
+            print(f"  {topics:>6} topics, {name:32s} {pages:>7} pages {seconds:8.2f}s, peak frontier {peak:>8}")
+
+
+SUITE_FORMAT = 1
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def suite_run(posts, seed=0, workers=1):
+    # One pass of the pipeline over a synthetic forum of `posts` posts, each stage timed on its own with METRICS
+    forum = syntheticForum(posts, seed=seed)
+    template_dir = os.path.abspath(stats.TEMPLATE_DIR)
+    METRICS.start()
+    tracker = scrapeTracker()
+    with tempfile.TemporaryDirectory() as tmp, open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        store_path, snapshot = os.path.join(tmp, "pages.db"), os.path.join(tmp, "scraped_data.db")
+        stats.TEMPLATE_DIR, stats.RENDER_CACHE_DIR = template_dir, os.path.join(tmp, "cache")
+        stats._environment, stats._manifest = None, None
+        os.makedirs(os.path.join(tmp, "pages"))
+
+        with METRICS.stage("generate"):
+            pages = forum.write_store(store_path)
+        with METRICS.stage("parse"):
+            records, (nbytes, seconds) = parse_stored_pages(open_store(store_path).rowids(), store_path)
+            parsed = dict(records)
+        tracker.parsed(nbytes, seconds)
+        data = new_data()
+        with METRICS.stage("crawl"):
+            crawl(None, data, tracker, start_url=forum.origin, store_path=store_path, parsed=parsed)
+        open_store(store_path).close()
+        with METRICS.stage("save"):
+            save_data(data["categories"].values(), data["topics"].values(), data["posts"].values(), data["authors"], file_name=snapshot)
+        del data, parsed, records
+        with METRICS.stage("load"):
+            categories, topics, posts_loaded, authors = load_data(snapshot)
+        with METRICS.stage("precompute"):
+            pre_compute_posts(posts_loaded, workers=workers, force_pre_compute=True)
+        with METRICS.stage("stats tables"):
+            engine = statsEngine(categories)
+        views = engine.calculate_views(VIEWS)
+        engine.calculate_windows(engine.time_windows())
+        with METRICS.stage("render"):
+            render_pages(
+                [
+                    dict(
+                        template_name="stats.html",
+                        output_file=f"view{i}.html",
+                        root=os.path.join(tmp, "pages") + os.sep,
+                        title=f"View {i}",
+                        summary=view["summary"],
+                        leaderboards=view["leaderboards"],
+                        print_len=25,
+                    )
+                    for i, view in enumerate(views)
+                ]
+            )
+        counts = {"pages": pages, "categories": len(categories), "topics": len(topics), "posts": len(posts_loaded), "authors": len(authors)}
+    stats.TEMPLATE_DIR = template_dir
+    return {"size": posts, "counts": counts, "stages": METRICS.stages, "counters": {"crawl": tracker.summary()}}
+
+
+def bench_suite(sizes=(1000, 10000, 100000), output="bench_results.json", baseline=None, seed=0, workers=1):
+    # The pipeline stage by stage over synthetic forums of each size, written to `output` as JSON. Runs of different
+    # commits can be compared with --baseline, which prints each stage's time as a ratio of the baseline file's.
+    results = {
+        "format": SUITE_FORMAT,
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "seed": seed,
+        "workers": workers,
+        "runs": [],
+    }
+    previous = {}
+    if baseline is not None:
+        with open(baseline, encoding="utf8") as f:
+            previous = {(run["size"], s["stage"]): s for run in json.load(f)["runs"] for s in run["stages"]}
+    print(f"Benchmark suite: synthetic forums of {', '.join(map(str, sizes))} posts, seed {seed}")
+    for size in sizes:
+        run = suite_run(size, seed=seed, workers=workers)
+        results["runs"].append(run)
+        print(f"  {size} posts, {run['counts']['topics']} topics, {run['counts']['authors']} authors, {run['counts']['pages']} pages")
+        for s in run["stages"]:
+            line = f"    {s['stage']:30s} {s['wall_s']:9.3f}s wall {s['cpu_s']:9.3f}s cpu {s['peak_rss_mb'] or 0:8.1f} MB peak"
+            old = previous.get((size, s["stage"]))
+            if old is not None and old["wall_s"] > 0:
+                line += f"  {s['wall_s'] / old['wall_s']:5.2f}x baseline"
+            print(line)
+    with open(output, "w", encoding="utf8") as f:
+        json.dump(results, f, indent=2)
+    print(f"  results written to {output}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks for the scraping and stats pipeline")
+    parser.add_argument(
+        "benchmark",
+        choices=[
+            "crawl",
+            "store",
+            "parse",
+            "rebuild",
+            "snapshot",
+            "tokenize",
+            "pre_compute",
+            "vocab",
+            "stats",
+            "aggregates",
+            "top_k",
+            "long_words",
+            "render",
+            "report",
+            "content",
+            "models",
+            "timestamps",
+            "resume",
+            "suite",
+            "frontier",
+            "fetch",
+            "windows",
+        ],
+    )
+    parser.add_argument("--backup-dir", default="backup", help="old one-file-per-page cache, used by the store benchmark")
+    parser.add_argument("--store", default="backup.db", help="page store served by the crawl benchmark")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds of latency injected per request")
+    parser.add_argument("--per-host", type=int, default=8)
+    parser.add_argument("--rps", type=float, default=None)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="post counts of the suite's synthetic forums")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_results.json", help="where the suite writes its results")
+    parser.add_argument("--baseline", help="earlier suite results to compare against")
+    args = parser.parse_args()
+    if args.benchmark == "crawl":
+        migrate_if_needed(args.store, args.backup_dir)
+        if not os.path.exists(args.store):
+            sys.exit(f"No saved pages found in {args.store}")
+        bench_crawl(args.store, args.latency, per_host=args.per_host, rps=args.rps)
+    elif args.benchmark == "store":
+        if not os.path.isdir(args.backup_dir):
+            sys.exit(f"No saved pages found in {args.backup_dir}/")
+        bench_store(args.backup_dir)
+    elif args.benchmark == "parse":
+        migrate_if_needed(args.store, args.backup_dir)
+        bench_parse(args.store)
+    elif args.benchmark == "rebuild":
+        migrate_if_needed(args.store, args.backup_dir)
+        bench_rebuild(args.store)
+    elif args.benchmark == "snapshot":
+        if not os.path.exists("scraped_data.db") and not os.path.exists("scraped_data.txt"):
+            sys.exit("No saved snapshot found")
+        bench_snapshot()
+    elif args.benchmark == "tokenize":
+        if not os.path.exists("scraped_data.db"):
+            sys.exit("No saved snapshot found")
+        bench_tokenize()
+    elif args.benchmark == "pre_compute":
+        if not os.path.exists("scraped_data.db"):
+            sys.exit("No saved snapshot found")
+        bench_pre_compute()
+    elif args.benchmark == "vocab":
+        if not os.path.exists("scraped_data.db"):
+            sys.exit("No saved snapshot found")
+        bench_vocab()
+    elif args.benchmark == "stats":
+        if not os.path.exists("scraped_data.db"):
+            sys.exit("No saved snapshot found")
+        bench_stats()
+    elif args.benchmark == "long_words":
+        if not os.path.exists("scraped_data.db"):
+            sys.exit("No saved snapshot found")
+        bench_long_words()
+    elif args.benchmark == "render":
+        if not os.path.exists("scraped_data.db"):
+            sys.exit("No saved snapshot found")
+        bench_render()
+    elif args.benchmark == "top_k":
+        bench_top_k()
+    elif args.benchmark == "aggregates":
+        if not os.path.exists("scraped_data.db"):
+            sys.exit("No saved snapshot found")
+        bench_aggregates()
+    elif args.benchmark == "report":
+        if not os.path.exists("scraped_data.db"):
+            sys.exit("No saved snapshot found")
+        bench_report()
+    elif args.benchmark == "content":
+        if not os.path.exists("scraped_data.db"):
+            sys.exit("No saved snapshot found")
+        if resource is None:
+            sys.exit("The content benchmark reads peak RSS from the resource module, which this platform lacks")
+        bench_content()
+    elif args.benchmark == "models":
+        if not os.path.exists("scraped_data.db"):
+            sys.exit("No saved snapshot found")
+        bench_models()
+    elif args.benchmark == "timestamps":
+        if not os.path.exists("scraped_data.db"):
+            sys.exit("No saved snapshot found")
+        bench_timestamps()
+    elif args.benchmark == "resume":
+        migrate_if_needed(args.store, args.backup_dir)
+        bench_resume(args.store)
+    elif args.benchmark == "suite":
+        bench_suite(args.sizes, args.output, args.baseline, args.seed)
+    elif args.benchmark == "frontier":
+        bench_frontier()
+    elif args.benchmark == "fetch":
+        migrate_if_needed(args.store, args.backup_dir)
+        bench_fetch(args.store, args.latency)
+    elif args.benchmark == "windows":
+        if not os.path.exists("scraped_data.db"):
+            sys.exit("No saved snapshot found")
+        bench_windows()
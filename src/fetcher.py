@@ -0,0 +1,75 @@
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib3.util.request import ACCEPT_ENCODING
+from pagestore import open_store
+
+# (connect, read) seconds
+TIMEOUT = (10, 30)
+# Statuses worth another try after a backoff; anything else that is not a 200 (or a 304 to a conditional request) fails
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class fetchError(Exception):
+    # A page that could not be fetched. Nothing is written to the page store for it, so a later crawl tries it again.
+    def __init__(self, url, reason):
+        super().__init__(f"Could not fetch {url}: {reason}")
+        self.url = url
+        self.reason = reason
+
+
+def configure_session(session, pool_size=8, pool_connections=4, retries=3, backoff=0.5):
+    # Keep-alive pools of pool_size connections for up to pool_connections hosts, retries with exponential backoff
+    # (honouring Retry-After) on connection errors and RETRY_STATUSES, and every compression urllib3 can decode here:
+    # gzip and deflate always, br and zstd when their packages are installed.
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=["GET", "HEAD"],
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["Accept-Encoding"] = ACCEPT_ENCODING
+    return session
+
+
+def make_session(**options):
+    return configure_session(requests.Session(), **options)
+
+
+def fetch_page(session, url, store_path="backup.db", tracker=None, conditional=True, timeout=TIMEOUT):
+    # Fetches url into the page store and returns its text. A page already in the store is revalidated with its ETag and
+    # Last-Modified, and when the server answers 304 the stored copy is returned without downloading the body again.
+    store = open_store(store_path)
+    meta = store.meta(url) if conditional else None
+    headers = {}
+    if meta is not None and meta["etag"]:
+        headers["If-None-Match"] = meta["etag"]
+    if meta is not None and meta["last_modified"]:
+        headers["If-Modified-Since"] = meta["last_modified"]
+
+    start = time.perf_counter()
+    try:
+        response = session.get(url, headers=headers, timeout=timeout)
+        body = response.content
+    except requests.RequestException as e:
+        raise fetchError(url, e) from e
+    if tracker is not None:
+        # tell() is what came over the wire, before decompression
+        tracker.fetched(time.perf_counter() - start, response.raw.tell() if response.raw is not None else len(body), response.status_code == 304)
+
+    if response.status_code == 304 and headers:
+        text = store.get(url)
+        if text is None:
+            return fetch_page(session, url, store_path, tracker, conditional=False, timeout=timeout)
+        store.revalidated(url, etag=response.headers.get("ETag"), last_modified=response.headers.get("Last-Modified"))
+        return text
+    if response.status_code != 200:
+        raise fetchError(url, f"HTTP {response.status_code}")
+    store.put(url, response.text, etag=response.headers.get("ETag"), last_modified=response.headers.get("Last-Modified"))
+    return response.text
@@ -0,0 +1,82 @@
+from collections import deque
+from pagestore import normalize_url
+
+HIGH, LOW = 0, 1
+
+
+class crawlFrontier:
+    # The pages a crawl has yet to visit. Listing pages (HIGH) all come before topic pages (LOW), and within a tier
+    # pages of categories with a lower category_priority come first, otherwise first in first out. A url is only ever
+    # queued once: it is checked against every url queued before, normalized, when it is found rather than when it
+    # comes off the queue, so pagination links repeated on every page of a topic never pile up.
+    def __init__(self, category_priority=None, max_depth=None):
+        self.category_priority = category_priority or {}  # category title -> rank, lower is crawled sooner, 0 by default
+        self.max_depth = max_depth  # links deeper than this many hops from the start page are not followed
+        self.queues = {}  # (tier, rank) -> deque of pages
+        self.known = set()  # normalized url of every page ever queued
+        self.met = set()  # every url as found, normalized or not
+        self.size = 0
+        self.peak = 0
+        self.queued = 0
+        self.duplicates = 0
+        self.too_deep = 0
+
+    def push(self, page, tier, depth=0):
+        # Returns whether the page was queued
+        if self.max_depth is not None and depth > self.max_depth:
+            self.too_deep += 1
+            return False
+        # Links come back as the same few strings over and over, only a url not met before is normalized
+        if page.url in self.met:
+            self.duplicates += 1
+            return False
+        self.met.add(page.url)
+        key = normalize_url(page.url)
+        if key in self.known:
+            self.duplicates += 1
+            return False
+        self.known.add(key)
+        page.depth = depth
+        rank = self.category_priority.get(page.category.title, 0) if page.category is not None else 0
+        queue = self.queues.get((tier, rank))
+        if queue is None:
+            queue = self.queues[(tier, rank)] = deque()
+        queue.append(page)
+        self.size += 1
+        self.queued += 1
+        self.peak = max(self.peak, self.size)
+        return True
+
+    def extend(self, pages, tier, depth=0):
+        # Returns how many of the pages were new
+        return sum(self.push(page, tier, depth) for page in pages)
+
+    def pop(self, high_only=False):
+        # (page, tier) of the next page to crawl, None when there is none (or no HIGH page, with high_only)
+        for key in sorted(self.queues):
+            if high_only and key[0] != HIGH:
+                break
+            queue = self.queues[key]
+            if queue:
+                self.size -= 1
+                return queue.popleft(), key[0]
+        return None
+
+    def pending(self, tier):
+        # The queued pages of a tier in the order they will be crawled
+        return [page for key in sorted(self.queues) if key[0] == tier for page in self.queues[key]]
+
+    def restore(self, high, low, known):
+        # Back to a checkpointed state: the queued pages of each tier, and the urls of pages already crawled
+        self.known.update(map(normalize_url, known))
+        for tier, pages in ((HIGH, high), (LOW, low)):
+            for page in pages:
+                self.known.discard(normalize_url(page.url))
+                self.push(page, tier, page.depth)
+
+    def __len__(self):
+        return self.size
+
+    def summary(self):
+        # The frontier counters for the metrics file
+        return {"peak_size": self.peak, "queued": self.queued, "duplicates_dropped": self.duplicates, "beyond_max_depth": self.too_deep}
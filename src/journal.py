@@ -0,0 +1,72 @@
+import os
+import json
+import time
+import pickle
+import sqlite3
+
+# Bumped when the page tuples or the frontier change shape, a journal of another version is started over
+JOURNAL_VERSION = 3
+
+# Every page the crawl has parsed, in order, with the pageRecord it gave, and the crawl frontier as of the last
+# checkpoint. Replaying the records through parse_page rebuilds exactly the objects the crawl had made, so an
+# interrupted scrape picks up from its last checkpoint without fetching or parsing those pages again.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (seq INTEGER PRIMARY KEY, page TEXT, record BLOB);
+CREATE TABLE IF NOT EXISTS checkpoint (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+class crawlJournal:
+    # Records are inserted as pages are parsed and only committed together with a checkpoint of the frontier, so what
+    # is on disk is always a frontier plus exactly the records that led up to it.
+    def __init__(self, path="crawl_journal.db", checkpoint_every=200, checkpoint_seconds=30):
+        self.path = path
+        self.checkpoint_every = checkpoint_every
+        self.checkpoint_seconds = checkpoint_seconds
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.pending = 0
+        self.last_checkpoint = time.monotonic()
+
+    def resume(self, refresh, start_url):
+        # (records, queue_high, queue_low, seen urls, counts) of an interrupted crawl of the same kind, with pages as the
+        # tuples scraper.page_state makes. None when there is nothing to resume, and then the journal is started over.
+        state = dict(self.conn.execute("SELECT key, value FROM checkpoint"))
+        if state.get("crawl") != json.dumps([JOURNAL_VERSION, refresh, start_url]) or "frontier" not in state:
+            self.reset(refresh, start_url)
+            return None
+        records = (
+            (tuple(json.loads(page)), pickle.loads(record)) for page, record in self.conn.execute("SELECT page, record FROM records ORDER BY seq")
+        )
+        frontier = json.loads(state["frontier"])
+        return records, list(map(tuple, frontier["queue_high"])), list(map(tuple, frontier["queue_low"])), set(frontier["seen"]), frontier["counts"]
+
+    def reset(self, refresh, start_url):
+        self.conn.execute("DELETE FROM records")
+        self.conn.execute("DELETE FROM checkpoint")
+        self.conn.execute("INSERT INTO checkpoint VALUES ('crawl', ?)", (json.dumps([JOURNAL_VERSION, refresh, start_url]),))
+        self.conn.commit()
+
+    def append(self, page, record):
+        self.conn.execute("INSERT INTO records (page, record) VALUES (?, ?)", (json.dumps(page), pickle.dumps(record)))
+        self.pending += 1
+
+    def due(self):
+        return self.pending >= self.checkpoint_every or (self.pending and time.monotonic() - self.last_checkpoint >= self.checkpoint_seconds)
+
+    def checkpoint(self, queue_high, queue_low, seen, counts):
+        # Commits the records appended since the last checkpoint together with the frontier they led to, so a crash at
+        # any point leaves the previous checkpoint intact. seen holds the urls of every page ever queued.
+        frontier = {"queue_high": queue_high, "queue_low": queue_low, "seen": sorted(seen), "counts": counts}
+        self.conn.execute("INSERT OR REPLACE INTO checkpoint VALUES ('frontier', ?)", (json.dumps(frontier),))
+        self.conn.commit()
+        self.pending = 0
+        self.last_checkpoint = time.monotonic()
+
+    def finish(self):
+        # The crawl's objects are in the snapshot now, nothing is left to resume
+        self.conn.close()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.path + suffix):
+                os.remove(self.path + suffix)
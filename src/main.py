@@ -1,79 +1,119 @@
-import cProfile
-from contextlib import redirect_stdout
+import argparse
+import tracemalloc
 
-from concurrent.futures import ThreadPoolExecutor
 from backup import save_data
+from models import pre_compute_posts
 from scraper import scrape
-from stats import calculate_stats, print_stats, render_to_file
+from stats import render_pages
+from report import reportWriter
+from stats_engine import statsEngine
+from aggregates import aggregateCache
+from metrics import METRICS
 import os
 
 os.environ['PYTHONUTF8'] = '1'
 
 
-def main(force_scrape=False, save_after_pre_compute=False):
+def main(force_scrape=False, save_after_pre_compute=False, metrics_path="metrics.json", profile_dir=None, incremental=False):
+    # Each stage's wall time, CPU time and peak memory go to metrics_path, with a cProfile dump per stage in profile_dir
+    METRICS.start(profile_dir)
     force_scrape = False
+    # With a saved snapshot, re-crawl the listings and fetch only the topics that changed since the last scrape
+    incremental_scrape = incremental
     force_pre_compute = False
     save_after_pre_compute = False
+    crawl_concurrency = 8
+    parse_workers = os.cpu_count() or 1
     print("Starting scraping...")
-    categories, topics, posts, authors = scrape(force_scrape=force_scrape)
+    categories, topics, posts, authors = scrape(
+        force_scrape=force_scrape, incremental=incremental_scrape, concurrency=crawl_concurrency, parse_workers=parse_workers
+    )
 
     print("Pre-computing statistics...")
-    for post in posts:
-        post.pre_compute(force_pre_compute=force_pre_compute)
-    # Save is called automatically in scrape, this is to save the pre-computed data (optional)
-    if save_after_pre_compute:
-        save_data(categories, topics, posts, authors)
+    with METRICS.stage("precompute"):
+        computed = pre_compute_posts(posts, workers=parse_workers, force_pre_compute=force_pre_compute)
+    # Save is called automatically in scrape, this saves the pre-computed data so later runs can skip it
+    if save_after_pre_compute or computed:
+        with METRICS.stage("save"):
+            save_data(categories, topics, posts, authors)
 
-    # Thread function to calculate stats
-    def calculate_wrapper(*args, **kwargs):
-        return calculate_stats(*args, **kwargs)
+    # The engine's tables are built once and every view is combined from them. They come from per-category
+    # aggregates kept in stats_cache.db, so only topics whose posts changed since the last run are folded in again.
+    with METRICS.stage("stats tables"):
+        engine = statsEngine(categories, aggregateCache("stats_cache.db"), authors.values())
+    include_fun_games_stats, exclude_fun_games_stats, just_general = engine.calculate_views(
+        [{}, {"exclude_categories": ["Fun & Games"]}, {"include_categories": ["General"]}]
+    )
+    # The last 7, 30 and 365 days and every month, over all categories, answered from a timestamp-sorted post index
+    windows = engine.time_windows()
+    window_stats = engine.calculate_windows(windows)
 
-    # Use ThreadPoolExecutor for parallel stat calculation
-    with ThreadPoolExecutor() as executor:
-        future_include_fun_games = executor.submit(calculate_wrapper, categories)
-        future_exclude_fun_games = executor.submit(calculate_wrapper, categories, exclude_categories=["Fun & Games"])
-        future_just_general = executor.submit(calculate_wrapper, categories, include_categories=["General"])
+    # The text report, plus the shown leaderboard rows as JSON and CSV, written in one pass
+    with METRICS.stage("report"), reportWriter("forum_summary.txt", json_path="forum_summary.json", csv_path="forum_summary.csv") as report:
+        report.write_stats(include_fun_games_stats, "Forum Leaderboard Including 'Fun & Games'")
+        report.write_stats(exclude_fun_games_stats, "Forum Leaderboard Excluding 'Fun & Games'")
+        report.write_stats(just_general, "Forum Leaderboard for Just 'General' Category")
 
-        include_fun_games_stats = future_include_fun_games.result()
-        exclude_fun_games_stats = future_exclude_fun_games.result()
-        just_general = future_just_general.result()
-
-    output_file = "forum_summary.txt"
-    with open(output_file, "w", encoding="utf8") as f:
-        with redirect_stdout(f):
-            print_stats(include_fun_games_stats, "Forum Leaderboard Including 'Fun & Games'")
-            print_stats(exclude_fun_games_stats, "Forum Leaderboard Excluding 'Fun & Games'")
-            print_stats(just_general, "Forum Leaderboard for Just 'General' Category")
-
-        render_to_file(
-            "stats.html",
-            "all_categories.html",
-            title="Leaderboards for All Categories (Including 'Fun & Games')",
-            summary=include_fun_games_stats["summary"],
-            leaderboards=include_fun_games_stats["leaderboards"],
-            print_len=25,
-        )
-
-        render_to_file(
-            "stats.html",
-            "exclude_games.html",
-            title="Leaderboards for All Categories (Excluding 'Fun & Games')",
-            summary=exclude_fun_games_stats["summary"],
-            leaderboards=exclude_fun_games_stats["leaderboards"],
-            print_len=25,
+    # Pages render concurrently, and a page whose inputs did not change since the last run is left as is
+    with METRICS.stage("render"):
+        render_pages(
+            [
+                dict(
+                    template_name="stats.html",
+                    output_file="all_categories.html",
+                    title="Leaderboards for All Categories (Including 'Fun & Games')",
+                    summary=include_fun_games_stats["summary"],
+                    leaderboards=include_fun_games_stats["leaderboards"],
+                    print_len=25,
+                ),
+                dict(
+                    template_name="stats.html",
+                    output_file="exclude_games.html",
+                    title="Leaderboards for All Categories (Excluding 'Fun & Games')",
+                    summary=exclude_fun_games_stats["summary"],
+                    leaderboards=exclude_fun_games_stats["leaderboards"],
+                    print_len=25,
+                ),
+                dict(
+                    template_name="stats.html",
+                    output_file="just_general.html",
+                    title="Leaderboards for General",
+                    summary=just_general["summary"],
+                    leaderboards=just_general["leaderboards"],
+                    print_len=25,
+                ),
+                *(
+                    dict(
+                        template_name="stats.html",
+                        output_file=f"{name}.html",
+                        title=f"Leaderboards for {title}",
+                        summary=stats["summary"],
+                        leaderboards=stats["leaderboards"],
+                        print_len=25,
+                    )
+                    for (title, name, _, _), stats in zip(windows, window_stats)
+                ),
+                dict(
+                    template_name="index.html",
+                    output_file="index.html",
+                    root="",
+                    title="Forum Leaderboards Home",
+                    windows=[{"title": title, "file": f"web/pages/{name}.html"} for title, name, _, _ in windows],
+                ),
+            ]
         )
-
-        render_to_file(
-            "stats.html",
-            "just_general.html",
-            title="Leaderboards for General",
-            summary=just_general["summary"],
-            leaderboards=just_general["leaderboards"],
-            print_len=25,
-        )
-
-        render_to_file("index.html", "index.html", root="", title="Forum Leaderboards Home")
+    if metrics_path is not None:
+        METRICS.write(metrics_path)
+        print(f"Stage metrics written to {metrics_path}.")
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--metrics", default="metrics.json", help="where to write the per-stage metrics JSON")
+    parser.add_argument("--profile", metavar="DIR", help="run every stage under cProfile and dump its pstats into DIR")
+    parser.add_argument("--incremental", action="store_true", help="refresh the saved snapshot with the topics that changed since the last scrape")
+    parser.add_argument("--trace-memory", action="store_true", help="also record each stage's peak Python allocation (slower)")
+    args = parser.parse_args()
+    if args.trace_memory:
+        tracemalloc.start()
+    main(metrics_path=args.metrics, profile_dir=args.profile, incremental=args.incremental)
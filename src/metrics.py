@@ -0,0 +1,90 @@
+import os
+import json
+import time
+import cProfile
+import datetime
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def peak_rss():
+    # Resident memory high-water mark in MB: VmHWM where /proc has it (reset per stage), else the process lifetime peak
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is not None:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return None
+
+
+def reset_peak_rss():
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def cpu_time():
+    # This process and the worker processes it has waited for
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+
+class pipelineMetrics:
+    # Wall time, CPU time and peak memory of each pipeline stage, plus counters such as the crawl's, written out as JSON
+    # at the end of a run. With a profile_dir every stage is also run under cProfile and dumped as <stage>.pstats.
+    def __init__(self):
+        self.start()
+
+    def start(self, profile_dir=None):
+        # A new run, so a process that runs the pipeline more than once writes each run's own stages
+        self.stages = []
+        self.counters = {}
+        self.profile_dir = profile_dir
+
+    @contextmanager
+    def stage(self, name):
+        profiler = None
+        if self.profile_dir is not None:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            profiler = cProfile.Profile()
+        reset_peak_rss()
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        wall, cpu = time.perf_counter(), cpu_time()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            entry = {"stage": name, "wall_s": time.perf_counter() - wall, "cpu_s": cpu_time() - cpu, "peak_rss_mb": peak_rss()}
+            if tracemalloc.is_tracing():
+                entry["peak_python_mb"] = tracemalloc.get_traced_memory()[1] / 2**20
+            self.stages.append(entry)
+            if profiler is not None:
+                profiler.dump_stats(os.path.join(self.profile_dir, "".join(c if c.isalnum() else "_" for c in name) + ".pstats"))
+
+    def write(self, path="metrics.json", history_path="metrics_history.jsonl"):
+        # The latest run in path, and one line per run appended to history_path for comparing runs
+        run = {"finished": datetime.datetime.now().isoformat(timespec="seconds"), "stages": self.stages, "counters": self.counters}
+        with open(path, "w", encoding="utf8") as f:
+            json.dump(run, f, indent=2)
+        if history_path is not None:
+            with open(history_path, "a", encoding="utf8") as f:
+                f.write(json.dumps(run) + "\n")
+        return run
+
+
+METRICS = pipelineMetrics()
@@ -1,27 +1,155 @@
 from collections import Counter
+from functools import lru_cache
 import datetime
 import hashlib
+import re
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+# Punctuation is turned into spaces in one str.translate; the literal two character sequences \n, \t and \r (escaped
+# newlines left in some posts) are removed first, before their backslash would be caught by the punctuation table.
+PUNCTUATION = str.maketrans({char: " " for char in "?/!-.,\":;\'()[]{}<>/\\|@#$%^&*_+=~`"})
+ESCAPED_WHITESPACE = re.compile(r"\\[ntr]")
+
+
+def tokenize(content):
+    content = content.lower()
+    if "https" in content or ".com" in content:
+        content = " ".join(word for word in content.split() if "https" not in word and ".com" not in word)
+    if "\\" in content:
+        content = ESCAPED_WHITESPACE.sub(" ", content)
+    return Counter(content.translate(PUNCTUATION).split())
+
+
+class vocabulary:
+    # Interns every word once. Posts keep parallel arrays of word ids and counts instead of a Counter of strings.
+    def __init__(self):
+        self.ids = {}
+        self.words = []
+        self.lengths = array("I")
+
+    def intern(self, word):
+        word_id = self.ids.get(word)
+        if word_id is None:
+            word_id = self.ids[word] = len(self.words)
+            self.words.append(word)
+            self.lengths.append(len(word))
+        return word_id
+
+    def encode(self, words):
+        return array("I", map(self.intern, words.keys())), array("I", words.values())
+
+    def char_count(self, word_ids, word_counts):
+        lengths = self.lengths
+        return sum(lengths[word_id] * count for word_id, count in zip(word_ids, word_counts))
+
+
+VOCAB = vocabulary()
+
+
+def long_word_rows(posts, min_length=10):
+    # (word ids, positions in posts) of every word longer than min_length in each post, as two arrays from one numpy
+    # pass over the batch
+    words = np.frombuffer(b"".join(post.word_ids for post in posts), dtype=np.uint32)
+    owners = np.repeat(np.arange(len(posts)), [len(post.word_ids) for post in posts])
+    long = np.frombuffer(VOCAB.lengths, dtype=np.uint32)[words] > min_length
+    return words[long], owners[long]
+
+
+def long_words(posts, min_length=10):
+    words, owners = long_word_rows(posts, min_length)
+    return list(zip(words.tolist(), owners.tolist()))
+
+
+def tokenize_batch(batch):
+    # Worker side of pre_compute_posts: only (load_id, content) pairs go in and plain word counts come back
+    return [(load_id, tokenize(content)) for load_id, content in batch]
+
+
+def pre_compute_posts(posts, workers=1, force_pre_compute=False, chunk_size=500):
+    # Tokenizes every post that still needs it, fanned out over `workers` processes. Returns how many were computed.
+    todo = {post.load_id: post for post in posts if force_pre_compute or not post.pre_compute_done}
+    if workers <= 1 or len(todo) < chunk_size:
+        for post in todo.values():
+            post.pre_compute(force_pre_compute=True)
+    else:
+        if not all(post.has_content() for post in todo.values()):
+            raise ValueError("Posts were loaded with content=False and have not been pre-computed, load them with their content to tokenize them.")
+        pairs = [(load_id, post.content) for load_id, post in todo.items()]
+        chunks = [pairs[i : i + chunk_size] for i in range(0, len(pairs), chunk_size)]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for results in executor.map(tokenize_batch, chunks):
+                for load_id, words in results:
+                    post = todo[load_id]
+                    post.words = words
+                    post.word_count = sum(words.values())
+                    post.pre_compute_done = True
+    return len(todo)
+
+
+# Post times are kept as integer seconds since EPOCH, reading the forum's local times as if they were UTC
+EPOCH = datetime.datetime(1970, 1, 1)
+FORUM_TIME_FORMAT = "%B %d, %Y, %I:%M %p"
+FORUM_TIME = re.compile(r"([A-Za-z]+) (\d{1,2}), (\d{4}), (\d{1,2}):(\d\d) ([AaPp])[Mm]")
+MONTHS = {datetime.date(2000, month, 1).strftime("%B").lower(): month for month in range(1, 13)}
+
+
+@lru_cache(maxsize=65536)
+def day_start(year, month, day):
+    return (datetime.date(year, month, day) - EPOCH.date()).days * 86400
+
+
+def parse_time(text):
+    # Forum dates like "March 5, 2021, 10:15 pm" to epoch seconds. Posts share few distinct days, so the day is looked up
+    # in a cache and the time of day added on; anything the pattern does not cover goes through strptime instead.
+    match = FORUM_TIME.fullmatch(text)
+    if match is not None:
+        month_name, day, year, hour, minute, half = match.groups()
+        month, hour, minute = MONTHS.get(month_name.lower()), int(hour), int(minute)
+        if month is not None and 1 <= hour <= 12 and minute < 60 and (len(day) == 1 or day[0] != "0" or day[1] != "0"):
+            try:
+                start = day_start(int(year), month, int(day))
+            except ValueError:
+                start = None
+            if start is not None:
+                return start + (hour % 12 + (12 if half in "Pp" else 0)) * 3600 + minute * 60
+    return int((datetime.datetime.strptime(text, FORUM_TIME_FORMAT) - EPOCH).total_seconds())
 
 
 class ForumObject:
+    # The models keep their fields in __slots__ rather than a per-object __dict__. load_id stays the stable id snapshots
+    # and aggregates store; its hash (the same value int(load_id, 16) hashes to) is worked out once, since every set and
+    # dict operation on a model needs it.
+    __slots__ = ("load_id", "hash")
+
+    def __init__(self, load_id):
+        self.load_id = load_id
+        self.hash = hash(int(load_id, 16))
+
     def __eq__(self, other):
         if isinstance(other, type(self)):
             return self.load_id == other.load_id
         return False
 
     def __hash__(self):
-        return int(self.load_id, 16)
+        return self.hash
 
     def __getstate__(self):
-        return {k: v for k, v in self.__dict__.items()}
+        base = dict(getattr(self, "__dict__", {}))
+        for cls in type(self).__mro__:
+            base.update((k, getattr(self, k)) for k in getattr(cls, "__slots__", ()) if k != "hash" and hasattr(self, k))
+        return base
 
 
 class Category(ForumObject):
+    __slots__ = ("title", "url", "topics")
+
     def __init__(self, title, url, topics=(), load_id=None):
+        super().__init__(hashlib.sha1(url.encode()).hexdigest() if load_id is None else load_id)
         self.title = title
         self.url = url
         self.topics = set(topics)
-        self.load_id = hashlib.sha1(url.encode()).hexdigest() if load_id is None else load_id
 
     def __getstate__(self):
         base = super().__getstate__()
@@ -29,25 +157,85 @@ class Category(ForumObject):
         return base
 
 
+# Topic digests are sums of post hashes kept to 62 bits, so they fit an SQLite integer
+DIGEST_MASK = 2**62 - 1
+
+
 class Topic(ForumObject):
-    def __init__(self, category, title, url, posts=(), author=None, load_id=None):
+    __slots__ = ("author", "category", "title", "url", "posts", "first", "last", "digest", "marker", "pages")
+
+    def __init__(self, category, title, url, posts=(), author=None, load_id=None, marker=None, pages=()):
+        super().__init__(hashlib.sha1(url.encode()).hexdigest() if load_id is None else load_id)
         self.author = author
         self.category = category
         self.title = title
         self.url = url
-        self.posts = set(posts)
-        self.load_id = hashlib.sha1(url.encode()).hexdigest() if load_id is None else load_id
+        self.posts = set()
+        self.first = self.last = None  # times of the oldest and newest post
+        self.digest = 0  # sum of the posts' hashes, which are stable across runs since they come from the load_ids
+        for post in posts:
+            self.add_post(post)
+
+        # for incremental scraping: listing row fingerprint, and the load_ids of the posts on each page already crawled
+        # (older snapshots only kept the page urls)
+        self.marker = marker
+        self.pages = {url: list(ids) for url, ids in pages.items()} if isinstance(pages, dict) else {url: [] for url in pages}
 
     def __getstate__(self):
         base = super().__getstate__()
         base["author"] = self.author.load_id if self.author else None
         base["category"] = self.category.load_id
         base["posts"] = [post.load_id for post in self.posts]
+        base["pages"] = {url: self.pages[url] for url in sorted(self.pages)}
         return base
 
+    def add_post(self, post):
+        # first and last are kept up to date as posts come in, so a topic's time span never has to look at its posts
+        if post in self.posts:
+            return
+        self.posts.add(post)
+        self.digest = (self.digest + post.hash) & DIGEST_MASK
+        if self.first is None or post.timestamp < self.first:
+            self.first = post.timestamp
+        if self.last is None or post.timestamp > self.last:
+            self.last = post.timestamp
+
+    def remove_post(self, post):
+        if post not in self.posts:
+            return
+        self.posts.discard(post)
+        self.digest = (self.digest - post.hash) & DIGEST_MASK
+        if post.timestamp in (self.first, self.last):
+            times = [p.timestamp for p in self.posts]
+            self.first, self.last = (min(times), max(times)) if times else (None, None)
+
+    def time_span(self):
+        return self.last - self.first if len(self.posts) > 1 else 0
+
+    def watermark(self):
+        # Changes whenever a post is added, removed or replaced by an edited version, without looking at the posts
+        return (len(self.posts), self.last, self.digest)
+
 
 class Post(ForumObject):
-    def __init__(self, topic, author, content, timestr, category=None, load_id=None, pre_compute_done=False, words=None, word_count=None):
+    __slots__ = (
+        "topic",
+        "category",
+        "author",
+        "timestamp",
+        "_content",
+        "content_ref",
+        "pre_compute_done",
+        "word_ids",
+        "word_counts",
+        "char_count",
+        "word_count",
+    )
+
+    def __init__(
+        self, topic, author, content, timestr, category=None, load_id=None, pre_compute_done=False, words=None, word_count=None, timestamp=None
+    ):
+        super().__init__(hashlib.sha1(content.encode()).hexdigest() if load_id is None else load_id)
         self.topic = topic
         if category is not None:
             self.category = category
@@ -56,46 +244,92 @@ class Post(ForumObject):
         else:
             self.category = None
         self.author = author
-        self.datetime = datetime.datetime.strptime(timestr, "%B %d, %Y, %I:%M %p")
-        self.content = content
-        self.load_id = hashlib.sha1(content.encode()).hexdigest() if load_id is None else load_id
+        self.timestamp = parse_time(timestr) if timestamp is None else timestamp
+        self.content = content  # also clears content_ref, see backup.contentFile
 
         # for pre-compute later:
-        self.pre_compute_done = False
-        self.words = None
-        self.word_count = None
+        self.pre_compute_done = pre_compute_done
+        self.words = words
+        self.word_count = word_count
+
+    @property
+    def datetime(self):
+        return EPOCH + datetime.timedelta(seconds=self.timestamp)
+
+    @property
+    def content(self):
+        # A post loaded from a snapshot leaves its text in the snapshot's content file, decoded again on every access
+        if self.content_ref is not None:
+            contents, offset, length = self.content_ref
+            return contents.text(offset, length)
+        return self._content
+
+    @content.setter
+    def content(self, content):
+        self._content = content
+        self.content_ref = None  # (contentFile, offset, length)
+
+    def content_bytes(self):
+        # UTF-8 text, copied straight out of the content file when it is still there
+        if self.content_ref is not None:
+            contents, offset, length = self.content_ref
+            return contents.raw(offset, length)
+        return self._content.encode("utf-8") if self._content is not None else None
+
+    def has_content(self):
+        return self.content_ref is not None or self._content is not None
+
+    @property
+    def words(self):
+        if self.word_ids is None:
+            return None
+        return Counter(dict(zip(map(VOCAB.words.__getitem__, self.word_ids), self.word_counts)))
+
+    @words.setter
+    def words(self, words):
+        if words is None:
+            self.set_words(None, None, None)
+        else:
+            word_ids, word_counts = VOCAB.encode(words)
+            self.set_words(word_ids, word_counts, VOCAB.char_count(word_ids, word_counts))
+
+    def set_words(self, word_ids, word_counts, char_count):
+        # char_count is the total length of all words, sum(len(word) * count)
+        self.word_ids = word_ids
+        self.word_counts = word_counts
+        self.char_count = char_count
 
     def __getstate__(self):
         base = super().__getstate__()
+        del base["word_ids"], base["word_counts"], base["_content"], base["content_ref"], base["timestamp"]
+        base["content"] = self.content
+        base["words"] = self.words
         base["topic"] = self.topic.load_id
         base["author"] = self.author.load_id
         base["category"] = self.category.load_id if self.category else None
-        base["datetime"] = (self.datetime.strftime("%B %d, %Y, %I:%M %p"),)
+        base["datetime"] = (self.datetime.strftime(FORUM_TIME_FORMAT),)
         return base
 
     def pre_compute(self, force_pre_compute=False):
+        # Returns whether anything was computed, so callers know when there are new results to save
         if self.pre_compute_done and not force_pre_compute:
-            return
-        chars = set("?/!-.,\":;\'()[]{}<>/\\|@#$%^&*_+=~`")
-        replace_chars = ["\n", "\\n", "\t", "\\t", "\r", "\\r"] + list(chars) + ["   ", "  "]
-        content = self.content.lower()
-        words = content.split()
-        words = [word for word in words if "https" not in word and ".com" not in word]
-        content = " ".join(words)
-
-        for char in replace_chars:
-            content = content.replace(char, " ")
-        self.words = Counter(content.split())
+            return False
+        if not self.has_content():
+            raise ValueError("Post was loaded with content=False and has not been pre-computed, load it with its content to tokenize it.")
+        self.words = tokenize(self.content)
         self.word_count = sum(self.words.values())
         self.pre_compute_done = True
+        return True
 
 
 class Author(ForumObject):
+    __slots__ = ("name", "posts", "new_threads", "url")
+
     def __init__(self, name, url, posts=(), new_threads=(), load_id=None):
+        super().__init__(hashlib.sha1(name.encode()).hexdigest() if load_id is None else load_id)
         self.name = name
         self.posts = set(posts)
         self.new_threads = set(new_threads)
-        self.load_id = hashlib.sha1(name.encode()).hexdigest() if load_id is None else load_id
         self.url = url
 
     def __getstate__(self):
@@ -106,9 +340,15 @@ class Author(ForumObject):
 
 
 class leaderboard(ForumObject):
-    def __init__(self, title, headers, data, PRINT_LEN):
+    def __init__(self, title, headers, data, PRINT_LEN, rank=None):
         self.title = title
         self.headers = headers
         self.data = data
         self.id = hashlib.sha1(title.encode()).hexdigest()
         self.PRINT_LEN = PRINT_LEN
+        self.rank_of = rank
+        self.formatted = None  # display copy, see stats.formatted
+
+    def rank(self, item):
+        # 1-based position of an author, topic or word on the full leaderboard, even when data only holds the top rows
+        return self.rank_of(item) if self.rank_of is not None else None
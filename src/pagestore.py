@@ -0,0 +1,169 @@
+import os
+import sys
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT PRIMARY KEY,
+    legacy_name TEXT,
+    fetched_at INTEGER,
+    etag TEXT,
+    last_modified TEXT,
+    content_hash TEXT,
+    body BLOB
+);
+CREATE INDEX IF NOT EXISTS pages_legacy_name ON pages (legacy_name);
+"""
+
+
+def normalize_url(url):
+    parts = urlsplit(url.strip())
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or "/", query, ""))
+
+
+def normalize_newlines(text):
+    # Cached pages used to be read back in text mode, so the parsers never saw a \r. Pages are stored and parsed with
+    # line breaks folded the same way, which keeps post content (and so post load_ids) the same however a page arrived.
+    return text.replace("\r\n", "\n").replace("\r", "\n")
+
+
+def legacy_name(url):
+    # File name the old flat backup/ cache used for this url
+    return url.replace("https://", "").replace("/", "_").replace("?", "_q_") + ".html"
+
+
+class pageStore:
+    # Single-file cache of fetched pages: zlib compressed bodies in SQLite, keyed by normalized url
+    def __init__(self, path="backup.db"):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def get(self, url):
+        key = normalize_url(url)
+        with self.lock:
+            row = self.conn.execute("SELECT body FROM pages WHERE url = ?", (key,)).fetchone()
+            if row is None:
+                # Pages migrated from backup/ only know their file name until they are first looked up
+                row = self.conn.execute("SELECT body FROM pages WHERE legacy_name = ? AND url LIKE 'legacy:%'", (legacy_name(url),)).fetchone()
+                if row is None:
+                    return None
+                self.conn.execute("UPDATE pages SET url = ? WHERE legacy_name = ? AND url LIKE 'legacy:%'", (key, legacy_name(url)))
+                self.conn.commit()
+        return zlib.decompress(row[0]).decode("utf-8")
+
+    def meta(self, url):
+        with self.lock:
+            row = self.conn.execute("SELECT fetched_at, etag, last_modified, content_hash FROM pages WHERE url = ?", (normalize_url(url),)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("fetched_at", "etag", "last_modified", "content_hash"), row))
+
+    def put(self, url, text, etag=None, last_modified=None, fetched_at=None):
+        body = normalize_newlines(text).encode("utf-8")
+        row = (
+            normalize_url(url),
+            legacy_name(url),
+            int(time.time()) if fetched_at is None else fetched_at,
+            etag,
+            last_modified,
+            hashlib.sha1(body).hexdigest(),
+            zlib.compress(body, 6),
+        )
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?)", row)
+            self.conn.commit()
+
+    def revalidated(self, url, etag=None, last_modified=None):
+        # The server confirmed the stored body is current; a 304 may carry fresh validators, otherwise the old ones stand
+        with self.lock:
+            self.conn.execute(
+                "UPDATE pages SET fetched_at = ?, etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified) WHERE url = ?",
+                (int(time.time()), etag, last_modified, normalize_url(url)),
+            )
+            self.conn.commit()
+
+    def __contains__(self, url):
+        return self.meta(url) is not None
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    def rowids(self):
+        with self.lock:
+            return [rowid for (rowid,) in self.conn.execute("SELECT rowid FROM pages ORDER BY rowid")]
+
+    def rows(self, rowids):
+        # (url, legacy_name, text) for the given rows; url is still "legacy:..." for migrated pages never looked up
+        with self.lock:
+            rows = self.conn.execute(f"SELECT url, legacy_name, body FROM pages WHERE rowid IN ({','.join('?' * len(rowids))})", rowids).fetchall()
+        for url, name, body in rows:
+            yield url, name, zlib.decompress(body).decode("utf-8")
+
+    def bodies(self):
+        with self.lock:
+            rows = self.conn.execute("SELECT body FROM pages").fetchall()
+        for (body,) in rows:
+            yield zlib.decompress(body).decode("utf-8")
+
+    def close(self):
+        _stores.pop(self.path, None)
+        self.conn.close()
+
+
+def migrate_backup_dir(store, backup_dir="backup"):
+    # One-shot import of the old one-file-per-page cache. File names cannot be turned back into urls reliably, so
+    # rows are keyed by file name until `get` first asks for their url.
+    count = 0
+    with store.lock:
+        for file_name in os.listdir(backup_dir):
+            if not file_name.endswith(".html"):
+                continue
+            file_path = os.path.join(backup_dir, file_name)
+            # Text mode, as the old cache was read, so \r\n comes back as \n
+            with open(file_path, "r", encoding="utf-8") as f:
+                body = f.read().encode("utf-8")
+            row = (
+                f"legacy:{file_name}",
+                file_name,
+                int(os.path.getmtime(file_path)),
+                None,
+                None,
+                hashlib.sha1(body).hexdigest(),
+                zlib.compress(body, 6),
+            )
+            store.conn.execute("INSERT OR IGNORE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?)", row)
+            count += 1
+        store.conn.commit()
+    return count
+
+
+_stores = {}
+
+
+def open_store(path="backup.db"):
+    if path not in _stores:
+        _stores[path] = pageStore(path)
+    return _stores[path]
+
+
+def migrate_if_needed(path="backup.db", backup_dir="backup"):
+    if not os.path.exists(path) and os.path.isdir(backup_dir):
+        print(f"Migrating {backup_dir}/ into {path}...")
+        print(f"Migrated {migrate_backup_dir(open_store(path), backup_dir)} pages.")
+
+
+if __name__ == "__main__":
+    backup_dir = sys.argv[1] if len(sys.argv) > 1 else "backup"
+    path = sys.argv[2] if len(sys.argv) > 2 else "backup.db"
+    print(f"Migrated {migrate_backup_dir(pageStore(path), backup_dir)} pages from {backup_dir}/ into {path}.")
@@ -0,0 +1,128 @@
+import lxml.html
+import lxml.etree
+from bs4 import BeautifulSoup
+from pagestore import normalize_newlines
+
+PARSER = "lxml"
+# Pages are parsed as the utf-8 bytes of their text, so an XML or meta encoding declaration left in the text is ignored
+LXML_PARSER = lxml.html.HTMLParser(encoding="utf-8")
+
+
+class pageRecord:
+    # Everything the scraper needs from one page, as plain values so records can be compared, pickled and cached
+    def __init__(self):
+        self.categories = []  # (title, url)
+        self.topics = []  # (title, url, whitespace-normalized text of the topic's listing row)
+        self.posts = []  # (author name or None, author url, date text or None, content)
+        self.first_post = False
+        self.first_author = None  # (name, url) of the first post's author, None when deleted
+        self.pages = []  # pagination urls
+
+    def __eq__(self, other):
+        return isinstance(other, pageRecord) and self.__dict__ == other.__dict__
+
+
+def extract(text, backend=None):
+    return BACKENDS[backend or PARSER](normalize_newlines(text))
+
+
+def extract_soup(text):
+    # Reference implementation: full html.parser tree with one find_all per element kind
+    soup = BeautifulSoup(text, "html.parser")
+    record = pageRecord()
+    for category in soup.find_all("a", class_="forum-title"):
+        record.categories.append((category.text, category["href"]))
+    for topic in soup.find_all("div", class_="topic-name"):
+        row = topic.parent if topic.parent is not None else topic
+        record.topics.append((topic.a.text, topic.a["href"], " ".join(row.get_text(" ").split())))
+
+    post_soup = soup.find_all("div", class_="post-element")
+    if post_soup and "first-post" in post_soup[0].get("class", []):
+        record.first_post = True
+        author_element = post_soup[0].find("a", class_="profile-link")
+        record.first_author = (author_element.text, author_element["href"]) if author_element is not None else None
+    for post in post_soup:
+        date_item = post.find("div", class_="forum-post-date")
+        author_element = post.find("a", class_="profile-link")
+        record.posts.append(
+            (
+                author_element.text if author_element is not None else None,
+                author_element["href"] if author_element is not None else None,
+                date_item.text if date_item is not None else None,
+                post.find("div", class_="post-message").text if date_item is not None else None,
+            )
+        )
+
+    next_page = soup.find("div", class_="pages-and-menu")
+    if next_page is not None:
+        pages = next_page.find("div", class_="pages")
+        if pages is not None:
+            record.pages = [a["href"] for a in pages.find_all("a", href=True)]
+    return record
+
+
+def has_class(element, name):
+    return name in element.get("class", "").split()
+
+
+def first_descendant(element, tag, name):
+    for child in element.iterdescendants(tag):
+        if has_class(child, name):
+            return child
+    return None
+
+
+def node_text(element):
+    # Same text as BeautifulSoup's .text: comments, scripts and styles are left out
+    return "".join(element.xpath(".//text()[not(ancestor::script) and not(ancestor::style)]"))
+
+
+def extract_lxml(text):
+    record = pageRecord()
+    try:
+        root = lxml.html.fromstring(text.encode("utf-8"), parser=LXML_PARSER)
+    except lxml.etree.ParserError:
+        # An empty, blank or comment-only page, which html.parser reads as a page with nothing on it
+        return record
+    menu = None
+    first_post = None
+    # A single walk over every <a> and <div>, only the four element kinds the scraper uses are ever read
+    for element in root.iter("a", "div"):
+        classes = element.get("class")
+        if not classes:
+            continue
+        classes = classes.split()
+        if element.tag == "a":
+            if "forum-title" in classes:
+                record.categories.append((node_text(element), element.attrib["href"]))
+        elif "topic-name" in classes:
+            link = next(element.iterdescendants("a"))
+            row = element.getparent() if element.getparent() is not None else element
+            row_text = " ".join(row.xpath(".//text()[not(ancestor::script) and not(ancestor::style)]"))
+            record.topics.append((node_text(link), link.attrib["href"], " ".join(row_text.split())))
+        elif "post-element" in classes:
+            if first_post is None:
+                first_post = element
+                record.first_post = "first-post" in classes
+            date_item = first_descendant(element, "div", "forum-post-date")
+            author_element = first_descendant(element, "a", "profile-link")
+            record.posts.append(
+                (
+                    node_text(author_element) if author_element is not None else None,
+                    author_element.get("href") if author_element is not None else None,
+                    node_text(date_item) if date_item is not None else None,
+                    node_text(first_descendant(element, "div", "post-message")) if date_item is not None else None,
+                )
+            )
+        elif "pages-and-menu" in classes and menu is None:
+            menu = element
+            pages = first_descendant(element, "div", "pages")
+            if pages is not None:
+                record.pages = [a.attrib["href"] for a in pages.iterdescendants("a") if "href" in a.attrib]
+    if record.first_post:
+        author_element = first_descendant(first_post, "a", "profile-link")
+        record.first_author = (node_text(author_element), author_element.get("href")) if author_element is not None else None
+    return record
+
+
+BACKENDS = {"html.parser": extract_soup, "lxml": extract_lxml}
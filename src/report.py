@@ -0,0 +1,78 @@
+import csv
+import json
+from tabulate import tabulate
+from models import Author, Topic
+from stats import formatted
+
+
+def plain(value):
+    # numpy scalars from the engine, as the int/float json and csv expect
+    return value.item() if hasattr(value, "item") else value
+
+
+def records(l):
+    # One dict per shown row of a leaderboard, with the raw value rather than its display string
+    for i, row in enumerate(l.data[: l.PRINT_LEN]):
+        item = row[0]
+        if isinstance(item, Author):
+            name, url, value = item.name, item.url, row[1]
+        elif isinstance(item, Topic):
+            name, url, value = item.title, item.url, row[1]
+        else:
+            # Longest Words rows are [authors, topics, word, length]
+            name, url, value = row[-2], "", row[-1]
+        yield {"rank": i + 1, "item": name, "url": url, "value": plain(value)}
+
+
+class reportWriter:
+    # Writes the forum_summary.txt text print_stats prints, formatting only the shown rows of each leaderboard and
+    # writing each table to the file as soon as tabulate has built it. The same rows go to a JSON and a CSV file in the
+    # same pass.
+    def __init__(self, path="forum_summary.txt", json_path=None, csv_path=None):
+        self.file = open(path, "w", encoding="utf8")
+        self.json_file = open(json_path, "w", encoding="utf8") if json_path is not None else None
+        self.csv_file = open(csv_path, "w", encoding="utf8", newline="") if csv_path is not None else None
+        self.views = 0
+        if self.json_file is not None:
+            self.json_file.write("[")
+        if self.csv_file is not None:
+            self.csv = csv.DictWriter(self.csv_file, ["view", "leaderboard", "rank", "item", "url", "value"])
+            self.csv.writeheader()
+
+    def write_stats(self, stats, title):
+        write = self.file.write
+        write(f"\n{'='*40}\n {title} \n{'='*40}\n\n")
+        self.write_table([list(item) for item in stats["summary"].items()], ["Metric", "Count"], floatfmt=".0f")
+        write("\nLeaderboard Details:\n\n")
+        boards = []
+        for l in stats["leaderboards"]:
+            write(f"{l.title}\n")
+            self.write_table([[i + 1, *row] for i, row in enumerate(formatted(l).data)], l.headers)
+            write("\n")
+            rows = list(records(l))
+            boards.append({"title": l.title, "headers": l.headers, "rows": rows})
+            if self.csv_file is not None:
+                self.csv.writerows({"view": title, "leaderboard": l.title, **r} for r in rows)
+
+        if self.json_file is not None:
+            view = {"title": title, "summary": {k: plain(v) for k, v in stats["summary"].items()}, "leaderboards": boards}
+            self.json_file.write(("," if self.views else "") + "\n" + json.dumps(view, ensure_ascii=False))
+        self.views += 1
+
+    def write_table(self, rows, headers, floatfmt="g"):
+        self.file.write(tabulate(rows, headers=headers, tablefmt="fancy_grid", floatfmt=floatfmt))
+        self.file.write("\n")
+
+    def close(self):
+        self.file.close()
+        if self.json_file is not None:
+            self.json_file.write("\n]\n")
+            self.json_file.close()
+        if self.csv_file is not None:
+            self.csv_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
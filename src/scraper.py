@@ -1,16 +1,34 @@
 import os
-import requests
-from bs4 import BeautifulSoup
+import asyncio
+import re
+import time
+import bisect
+import threading
+import hashlib
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+from parse import extract
 from models import Category, Topic, Post, Author
 from backup import load_data, save_data
-import heapq
+from journal import crawlJournal
+from frontier import crawlFrontier, HIGH, LOW
+from fetcher import fetch_page, fetchError, configure_session, make_session
+from metrics import METRICS
+from pagestore import open_store, migrate_if_needed, pageStore, normalize_url, legacy_name
 
 
 class pageWrapper:
-    def __init__(self, url, category=None, topic=None):
+    def __init__(self, url, category=None, topic=None, refresh=False, depth=0, marker=None):
         self.url = url
         self.category = category
         self.topic = topic
+        # refresh pages bypass the backup/ cache and are always fetched from the web
+        self.refresh = refresh
+        # links followed from the start page to get here, set when the page is queued
+        self.depth = depth
+        # the topic's listing marker, only stored on the topic once this page has been parsed
+        self.marker = marker
 
     def __eq__(self, other):
         if isinstance(other, pageWrapper):
@@ -21,94 +39,222 @@ class pageWrapper:
         return hash(self.url)
 
 
-def get_or_create_author(author_element, authors):
-    author_name = author_element.text if author_element is not None else "deleted"
+def get_or_create_author(author_name, author_url, authors):
+    author_name = author_name if author_name is not None else "deleted"
     if author_name not in authors:
-        authors[author_name] = Author(author_name, author_element["href"])
+        authors[author_name] = Author(author_name, author_url)
     return authors[author_name]
 
 
-def search_page(page, session, data, tracker):
-    soup, from_web = read_or_call_url(session, page.url)
-    tracker.scraped += 1
-    if from_web:
-        tracker.from_web += 1
+def page_number(url):
+    # Pagination links carry the page as a numeric query parameter (?part=3) or a /page/3/ path segment
+    query = urlsplit(url)
+    numbers = [int(v) for values in parse_qs(query.query).values() for v in values if v.isdigit()]
+    if numbers:
+        return max(numbers)
+    match = re.search(r"/page/(\d+)/?$", query.path)
+    return int(match.group(1)) if match else 1
+
+
+def listing_marker(row_text):
+    # The topic's row in the category listing shows its reply count and last post, so any new activity changes its text
+    return hashlib.sha1(row_text.encode()).hexdigest()
+
+
+def search_page(page, session, data, tracker, store_path="backup.db", parsed=None, journal=None):
+    record = find_parsed(parsed, page.url) if parsed and not page.refresh else None
+    if record is not None:
+        tracker.count(False)
     else:
-        tracker.from_backup += 1
+        text, from_web = read_or_call_url(session, page.url, store_path, refresh=page.refresh, tracker=tracker)
+        tracker.count(from_web)
+        record = timed_extract(text, tracker)
+    if journal is not None:
+        journal.append(page_state(page), record)
+    return parse_page(page, record, data)
+
+
+def timed_extract(text, tracker):
+    start = time.perf_counter()
+    record = extract(text)
+    tracker.parsed(len(text.encode()), time.perf_counter() - start)
+    return record
+
+
+def page_state(page):
+    # A pageWrapper as plain values for the crawl journal, objects by load_id
+    return (
+        page.url,
+        page.category.load_id if page.category else None,
+        page.topic.load_id if page.topic else None,
+        page.refresh,
+        page.depth,
+        page.marker,
+    )
+
+
+def page_from_state(state, data):
+    url, category, topic, refresh, depth, marker = state
+    return pageWrapper(
+        url,
+        category=data["categories"][category] if category is not None else None,
+        topic=data["topics"][topic] if topic is not None else None,
+        refresh=refresh,
+        depth=depth,
+        marker=marker,
+    )
+
+
+def resume_crawl(journal, data, tracker, start_url, refresh, frontier):
+    # Replays the pages an interrupted crawl had parsed, which rebuilds the objects it had made, and puts its frontier
+    # back. Returns whether there was anything to resume.
+    resumed = journal.resume(refresh, start_url)
+    if resumed is None:
+        return False
+    records, queue_high, queue_low, seen, counts = resumed
+    replayed = 0
+    for state, record in records:
+        parse_page(page_from_state(state, data), record, data)
+        replayed += 1
+    tracker.scraped, tracker.from_web, tracker.from_backup = counts
+    print(f"Resuming an interrupted crawl: {replayed} pages replayed from the journal, {len(queue_high) + len(queue_low)} pages left to crawl.")
+    frontier.restore([page_from_state(s, data) for s in queue_high], [page_from_state(s, data) for s in queue_low], seen)
+    return True
+
+
+def parse_stored_pages(rowids, store_path="backup.db"):
+    # Runs in a worker process, so it opens its own connection instead of sharing the parent's. Returns the parsed
+    # pages with the bytes and seconds it took to parse them.
+    store = pageStore(store_path)
+    tracker = scrapeTracker()
+    try:
+        pages = [(legacy if url.startswith("legacy:") else url, timed_extract(text, tracker)) for url, legacy, text in store.rows(rowids)]
+    finally:
+        store.conn.close()
+    return pages, (tracker.bytes_parsed, tracker.parse_seconds)
+
+
+def parse_store(store_path="backup.db", workers=None, chunk_size=64, tracker=None):
+    # Parses every cached page across a process pool. Workers only send back plain pageRecords, the object graph is
+    # still built in this process by crawl() so load_ids and associations come out exactly as in a serial crawl.
+    rowids = open_store(store_path).rowids()
+    chunks = [rowids[i : i + chunk_size] for i in range(0, len(rowids), chunk_size)]
+    parsed = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for records, (nbytes, seconds) in executor.map(parse_stored_pages, chunks, repeat(store_path)):
+            parsed.update(records)
+            if tracker is not None:
+                tracker.parsed(nbytes, seconds)
+    return parsed
+
+
+def find_parsed(parsed, url):
+    return parsed.pop(normalize_url(url), None) or parsed.pop(legacy_name(url), None)
+
+
+def parse_page(page, record, data):
     new_high, new_low = set(), set()
     if page.topic is None:
-        new_high.update(find_next_page(soup, data, page))
+        new_high.update(find_next_page(record, data, page))
     else:
-        new_low.update(find_next_page(soup, data, page))
-    new_high.update(find_categories(soup, data, page))
+        new_low.update(find_next_page(record, data, page))
+    new_high.update(find_categories(record, data, page))
     if page.category is not None:
-        new_low.update(find_topics(soup, data, page))
+        new_low.update(find_topics(record, data, page))
     if page.topic is not None:
-        find_posts(soup, data, page)
+        find_posts(record, data, page)
     return new_high, new_low
 
 
-def find_categories(soup, data, page):
-    categories_soup = soup.find_all("a", class_="forum-title")
+def find_categories(record, data, page):
     new_pages = set()
-    for category in categories_soup:
-        c_obj = Category(category.text, category["href"])
-        data["categories"].add(c_obj)
-        new_pages.add(pageWrapper(category["href"], category=c_obj))
+    for title, url in record.categories:
+        c_obj = Category(title, url)
+        c_obj = data["categories"].setdefault(c_obj.load_id, c_obj)
+        new_pages.add(pageWrapper(url, category=c_obj, refresh=page.refresh))
     return new_pages
 
 
-def find_topics(soup, data, page):
+def find_topics(record, data, page):
     category = page.category
-    topic_soup = soup.find_all("div", class_="topic-name")
     new_pages = set()
-    for topic in topic_soup:
-        t = Topic(category, topic.a.text, topic.a["href"])
-        category.topics.add(t)
-        data["topics"].add(t)
-        new_pages.add(pageWrapper(topic.a["href"], category=category, topic=t))
+    for title, url, row_text in record.topics:
+        t = Topic(category, title, url)
+        known = data["topics"].get(t.load_id)
+        marker = listing_marker(row_text)
+        if known is None:
+            category.topics.add(t)
+            data["topics"][t.load_id] = t
+            new_pages.add(pageWrapper(t.url, category=category, topic=t, refresh=page.refresh, marker=marker))
+        elif not page.refresh:
+            new_pages.add(pageWrapper(known.url, category=category, topic=known))
+        elif known.marker != marker:
+            # Only the last page we already have can have gained posts, later pages are found from its pagination
+            last_page = max(known.pages, key=page_number, default=known.url)
+            new_pages.add(pageWrapper(last_page, category=category, topic=known, refresh=True, marker=marker))
     return new_pages
 
 
-def find_posts(soup, data, page):
+def find_posts(record, data, page):
     topic = page.topic
     authors = data["authors"]
-    post_soup = soup.find_all("div", class_="post-element")
 
     # Manage post and topic authors
-    if topic.author is None and post_soup and "first-post" in post_soup[0].get("class", []):
-        author_element = post_soup[0].find("a", class_="profile-link")
-        author = get_or_create_author(author_element, authors)
+    if topic.author is None and record.first_post:
+        author = get_or_create_author(*(record.first_author or (None, None)), authors)
         topic.author = author
         author.new_threads.add(topic)
 
-    for post in post_soup:
-        date_item = post.find("div", class_="forum-post-date")
-        if date_item is None:
+    page_posts = []
+    for author_name, author_url, date, content in record.posts:
+        if date is None:
             continue
-        date = date_item.text
-        content = post.find("div", class_="post-message").text
-        author = get_or_create_author(post.find("a", class_="profile-link"), authors)
+        author = get_or_create_author(author_name, author_url, authors)
         p = Post(topic, author, content, date)
         author.posts.add(p)
         if p.content == "":
             print("here!")
         elif not isinstance(p.content, str):
             print("here!")
-        topic.posts.add(p)
-        data["posts"].add(p)
+        topic.add_post(p)
+        data["posts"].setdefault(p.load_id, p)
+        page_posts.append(p.load_id)
+
+    # A refreshed page replaces what it held before: a post edited since then has a new load_id, its old version goes.
+    # Posts are keyed by their content, so one still on another page, or another topic's, is left alone.
+    for load_id in set(topic.pages.get(page.url, ())).difference(page_posts):
+        old = data["posts"].get(load_id)
+        if old is None or old.topic is not topic or any(load_id in ids for url, ids in topic.pages.items() if url != page.url):
+            continue
+        del data["posts"][load_id]
+        topic.remove_post(old)
+        old.author.posts.discard(old)
+    topic.pages[page.url] = page_posts
+    if page.marker is not None:
+        topic.marker = page.marker
+
+
+def fetch_failed(page, tracker, error):
+    # A topic with a page that could not be fetched loses its listing marker, so the next incremental scrape sees it
+    # as changed and fetches it again
+    tracker.failed.append(page.url)
+    if page.topic is not None:
+        page.topic.marker = None
+    print(error)
 
 
-def find_next_page(soup, data, page):
+def find_next_page(record, data, page):
     new_pages = set()
-    next_page = soup.find("div", class_="pages-and-menu")
-    if next_page is not None:
-        pages = next_page.find("div", class_="pages")
-        if pages is not None:
-            for a in pages.find_all("a", href=True):
-                category = page.category if page.category is not None else page.topic.category
-                topic = page.topic if page.topic is not None else None
-                new_pages.add(pageWrapper(a["href"], category=category, topic=topic))
+    for url in record.pages:
+        category = page.category if page.category is not None else page.topic.category
+        topic = page.topic if page.topic is not None else None
+        refresh = page.refresh
+        if refresh and topic is not None:
+            # Earlier pages of a refreshed topic are unchanged, only pages past the last one we had are new
+            if url in topic.pages:
+                continue
+            refresh = page_number(url) > max(map(page_number, topic.pages), default=1)
+        new_pages.add(pageWrapper(url, category=category, topic=topic, refresh=refresh))
     return new_pages
 
 
@@ -130,24 +276,21 @@ def printProgressBar(iteration, total, prefix="", suffix="", decimals=1, length=
         print()
 
 
-def read_or_call_url(session, url, save_dir="backup"):
-    # Create a file path based on the URL
-    file_name = url.replace("https://", "").replace("/", "_").replace("?", "_q_") + ".html"
-    file_path = os.path.join(save_dir, file_name)
+def read_cached(url, store_path="backup.db"):
+    return open_store(store_path).get(url)
 
-    # Check if the file already exists
-    if os.path.exists(file_path):
-        # print(f"Loading from saved file: {file_path}")
-        with open(file_path, "r", encoding="utf-8") as file:
-            return BeautifulSoup(file.read(), "html.parser"), False
 
-    # Fetch the URL if not already saved
-    # print(f"Fetching and saving: {url}")
-    response = session.get(url)
-    os.makedirs(save_dir, exist_ok=True)
-    with open(file_path, "w", encoding="utf-8") as file:
-        file.write(response.text)
-    return BeautifulSoup(response.text, "html.parser"), True
+def read_or_call_url(session, url, store_path="backup.db", refresh=False, tracker=None):
+    text = None if refresh else read_cached(url, store_path)
+    if text is not None:
+        return text, False
+
+    # Fetch the URL if not already saved, or revalidate the saved copy when refreshing
+    return fetch_page(session, url, store_path, tracker), True
+
+
+# Upper bounds in ms of the fetch latency histogram buckets; slower fetches land in the last, open bucket
+LATENCY_BUCKETS = [50, 100, 250, 500, 1000, 2500, 5000]
 
 
 class scrapeTracker:
@@ -155,52 +298,245 @@ class scrapeTracker:
         self.scraped = 0
         self.from_web = 0
         self.from_backup = 0
-
-
-def scrape(force_scrape=False):
-    if not force_scrape:
-        values = load_data()
-        if values:
-            categories, topics, posts, authors = values
-            print("Skipping scraping. Data already loaded.")
-            return categories, topics, posts, authors
-    data = {"categories": set(), "topics": set(), "posts": set(), "authors": {"deleted": Author("deleted", None)}}
-    session = requests.Session()
+        self.latency = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.fetch_seconds = 0.0
+        self.bytes_downloaded = 0
+        self.not_modified = 0
+        self.failed = []
+        # fetches are recorded from the concurrent crawl's worker threads
+        self.lock = threading.Lock()
+        self.bytes_parsed = 0
+        self.parse_seconds = 0.0
+
+    def count(self, from_web):
+        self.scraped += 1
+        if from_web:
+            self.from_web += 1
+        else:
+            self.from_backup += 1
+
+    def fetched(self, seconds, nbytes=0, not_modified=False):
+        with self.lock:
+            self.latency[bisect.bisect_left(LATENCY_BUCKETS, seconds * 1000)] += 1
+            self.fetch_seconds += seconds
+            self.bytes_downloaded += nbytes
+            self.not_modified += not_modified
+
+    def parsed(self, nbytes, seconds):
+        self.bytes_parsed += nbytes
+        self.parse_seconds += seconds
+
+    def summary(self):
+        # The crawl counters for the metrics file
+        labels = [f"<={b}" for b in LATENCY_BUCKETS] + [f">{LATENCY_BUCKETS[-1]}"]
+        return {
+            "pages": self.scraped,
+            "from_web": self.from_web,
+            "from_backup": self.from_backup,
+            "cache_hit_ratio": self.from_backup / self.scraped if self.scraped else None,
+            "fetch_latency_ms": dict(zip(labels, self.latency)),
+            "fetch_seconds": self.fetch_seconds,
+            "bytes_downloaded": self.bytes_downloaded,
+            "not_modified": self.not_modified,
+            "failed": len(self.failed),
+            "bytes_parsed": self.bytes_parsed,
+            "parse_seconds": self.parse_seconds,
+        }
+
+
+class rateLimiter:
+    # Spaces out request start times so that at most `rps` requests begin per second
+    def __init__(self, rps=None):
+        self.interval = 1 / rps if rps else 0
+        self.next_slot = 0.0
+        self.lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self.lock:
+            now = time.monotonic()
+            delay = self.next_slot - now
+            self.next_slot = max(now, self.next_slot) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def report_progress(tracker, page, remaining, discovered):
+    scrape_str = f"{page.category.title if page.category else ''} {page.topic.title if page.topic else ''}"
+    scrape_str = scrape_str[:50] + "..." if len(scrape_str) > 50 else scrape_str + " " * (53 - len(scrape_str))
+
+    printProgressBar(
+        tracker.scraped,
+        tracker.scraped + remaining + 1,
+        prefix=f"Scraped {tracker.from_web} From web and {tracker.from_backup} from backup. {remaining} (+{discovered}) discovered pages remaining.",
+        suffix=f"Scraping {scrape_str}",
+        length=50,
+    )
+
+
+def crawl(
+    session, data, tracker, start_url="https://apda.online/forum/", store_path="backup.db", refresh=False, parsed=None, journal=None, frontier=None
+):
+    frontier = frontier if frontier is not None else crawlFrontier()
+    if journal is None or not resume_crawl(journal, data, tracker, start_url, refresh, frontier):
+        frontier.push(pageWrapper(start_url, refresh=refresh), HIGH)
+    print("\n\n\n")
+    while len(frontier):
+        page, _ = frontier.pop()
+        try:
+            new_high, new_low = search_page(page, session, data, tracker, store_path, parsed, journal)
+        except fetchError as e:
+            fetch_failed(page, tracker, e)
+            continue
+        discovered = frontier.extend(new_high, HIGH, page.depth + 1) + frontier.extend(new_low, LOW, page.depth + 1)
+        report_progress(tracker, page, len(frontier), discovered)
+        if journal is not None and journal.due():
+            journal.checkpoint(
+                list(map(page_state, frontier.pending(HIGH))),
+                list(map(page_state, frontier.pending(LOW))),
+                frontier.known,
+                [tracker.scraped, tracker.from_web, tracker.from_backup],
+            )
+
+
+async def crawl_async(
+    session,
+    data,
+    tracker,
+    start_url="https://apda.online/forum/",
+    concurrency=8,
+    per_host=4,
+    rps=None,
+    store_path="backup.db",
+    refresh=False,
+    journal=None,
+    frontier=None,
+):
+    # Fetches run in worker threads while parsing stays on the event loop, so `data` is only ever touched by one thread.
+    # Low priority (topic) pages are not started while any high priority page is queued or in flight, which keeps the
+    # category-before-topic ordering of `crawl`.
+    # per_host is the most connections ever open to one host, so it is what each host's pool has to hold
+    configure_session(session, pool_size=per_host)
+    host_limits = {}
+    limiter = rateLimiter(rps)
+    # A pool of our own: asyncio's default executor has min(32, cpus + 4) threads and would cap concurrency below that
+    pool = ThreadPoolExecutor(max_workers=concurrency)
+    loop = asyncio.get_running_loop()
+
+    async def fetch(page, high):
+        text = None if page.refresh else await loop.run_in_executor(pool, read_cached, page.url, store_path)
+        if text is not None:
+            return page, high, text, False
+        host = urlsplit(page.url).netloc
+        if host not in host_limits:
+            host_limits[host] = asyncio.Semaphore(per_host)
+        async with host_limits[host]:
+            await limiter.wait()
+            text = await loop.run_in_executor(pool, fetch_page, session, page.url, store_path, tracker)
+        return page, high, text, True
+
+    frontier = frontier if frontier is not None else crawlFrontier()
+    if journal is None or not resume_crawl(journal, data, tracker, start_url, refresh, frontier):
+        frontier.push(pageWrapper(start_url, refresh=refresh), HIGH)
+    in_flight = set()
+    flying = {}  # task -> (page, high), so a checkpoint can put pages still being fetched back on their queue
+    high_in_flight = 0
+    print("\n\n\n")
+    try:
+        while len(frontier) or in_flight:
+            while len(in_flight) < concurrency:
+                next_page = frontier.pop(high_only=bool(high_in_flight))
+                if next_page is None:
+                    break
+                page, tier = next_page
+                high = tier == HIGH
+                high_in_flight += high
+                task = asyncio.create_task(fetch(page, high))
+                in_flight.add(task)
+                flying[task] = (page, high)
+            if not in_flight:
+                continue
+            done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                page, high = flying.pop(task)
+                high_in_flight -= high
+                try:
+                    page, high, text, from_web = task.result()
+                except fetchError as e:
+                    fetch_failed(page, tracker, e)
+                    continue
+                tracker.count(from_web)
+                record = timed_extract(text, tracker)
+                if journal is not None:
+                    journal.append(page_state(page), record)
+                new_high, new_low = parse_page(page, record, data)
+                discovered = frontier.extend(new_high, HIGH, page.depth + 1) + frontier.extend(new_low, LOW, page.depth + 1)
+                report_progress(tracker, page, len(frontier) + len(in_flight), discovered)
+            if journal is not None and journal.due():
+                journal.checkpoint(
+                    [page_state(page) for page, high in flying.values() if high] + list(map(page_state, frontier.pending(HIGH))),
+                    [page_state(page) for page, high in flying.values() if not high] + list(map(page_state, frontier.pending(LOW))),
+                    frontier.known,
+                    [tracker.scraped, tracker.from_web, tracker.from_backup],
+                )
+    finally:
+        pool.shutdown()
+
+
+def scrape(force_scrape=False, incremental=False, concurrency=1, per_host=4, rps=None, parse_workers=1, category_priority=None, max_depth=None):
+    with METRICS.stage("load"):
+        values = load_data() if not force_scrape else False
+    if values and not incremental:
+        categories, topics, posts, authors = values
+        print("Skipping scraping. Data already loaded.")
+        return categories, topics, posts, authors
+    data = {"categories": {}, "topics": {}, "posts": {}, "authors": {"deleted": Author("deleted", None)}}
+    if values:
+        # Re-crawl on top of the loaded graph: listing pages are refreshed and only topics whose listing changed are fetched
+        categories, topics, posts, authors = values
+        data["categories"].update((c.load_id, c) for c in categories)
+        data["topics"].update((t.load_id, t) for t in topics)
+        data["posts"].update((p.load_id, p) for p in posts)
+        data["authors"].update(authors)
+    migrate_if_needed()
+    session = make_session()
     login_url = "https://apda.online/wp-login.php?loggedout=true&wp_lang=en_US"
     response = session.post(login_url, data={"log": os.getenv("USERNAME"), "pwd": os.getenv("PASSWORD")})
     if response.status_code != 200:
         print("Login failed. Exiting.")
         return
-    seen = set()
-    queue_high = []
-    queue_low = []
-    queue_high.append(pageWrapper("https://apda.online/forum/"))
     tracker = scrapeTracker()
-    print("\n\n\n")
-    while queue_high or queue_low:
-        if queue_high:
-            page = queue_high.pop(0)
-        else:
-            page = queue_low.pop(0)
-        if page in seen:
-            continue
-        seen.add(page)
-        new_high, new_low = search_page(page, session, data, tracker)
-        new_high -= seen
-        new_low -= seen
-        queue_high.extend(new_high)
-        queue_low.extend(new_low)
-        scrape_str = f"{page.category.title if page.category else ''} {page.topic.title if page.topic else ''}"
-        scrape_str = scrape_str[:50] + "..." if len(scrape_str) > 50 else scrape_str + " " * (53 - len(scrape_str))
-
-        printProgressBar(
-            tracker.scraped,
-            tracker.scraped + len(queue_high) + len(queue_low) + 1,
-            prefix=f"Scraped {tracker.from_web} From web and {tracker.from_backup} from backup. {len(queue_high)+len(queue_low)} (+{len(new_high)+len(new_low)}) discovered pages remaining.",
-            suffix=f"Scraping {scrape_str}",
-            length=50,
-        )
+    refresh = bool(values)
+    # Parsed pages are journaled as the crawl goes, so a crawl that is cut short resumes from its last checkpoint
+    journal = crawlJournal()
+    frontier = crawlFrontier(category_priority, max_depth)
+    if not refresh and parse_workers > 1 and len(open_store()):
+        # Rebuilding from the page store: parse every cached page up front on all cores, then stitch serially
+        print(f"Parsing {len(open_store())} cached pages with {parse_workers} workers...")
+        with METRICS.stage("parse"):
+            parsed = parse_store(workers=parse_workers, tracker=tracker)
+        with METRICS.stage("crawl"):
+            crawl(session, data, tracker, parsed=parsed, journal=journal, frontier=frontier)
+    elif concurrency > 1:
+        with METRICS.stage("crawl"):
+            asyncio.run(
+                crawl_async(
+                    session, data, tracker, concurrency=concurrency, per_host=per_host, rps=rps, refresh=refresh, journal=journal, frontier=frontier
+                )
+            )
+    else:
+        with METRICS.stage("crawl"):
+            crawl(session, data, tracker, refresh=refresh, journal=journal, frontier=frontier)
+    METRICS.counters["crawl"] = tracker.summary()
+    METRICS.counters["frontier"] = frontier.summary()
 
     print("Done scraping!")
-    save_data(**data)
-    return data["categories"], data["topics"], data["posts"], data["authors"]
+    if tracker.failed:
+        print(f"{len(tracker.failed)} pages could not be fetched, the next incremental scrape will fetch them again.")
+    if refresh:
+        print(f"Incremental scrape made {tracker.from_web} requests, {len(data['posts']) - len(posts)} new posts.")
+    with METRICS.stage("save"):
+        save_data(data["categories"].values(), data["topics"].values(), data["posts"].values(), data["authors"])
+    journal.finish()
+    return data["categories"].values(), data["topics"].values(), data["posts"].values(), data["authors"]
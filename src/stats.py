@@ -1,9 +1,14 @@
+import heapq
 from collections import Counter, defaultdict
 from string import Formatter
 from tabulate import tabulate
-from models import Author, Topic, leaderboard
-from jinja2 import Environment, FileSystemLoader
+from models import Author, Topic, leaderboard, long_words, VOCAB
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache
+from concurrent.futures import ThreadPoolExecutor
 import os
+import json
+import hashlib
+import threading
 
 MIN_POSTS = 3
 AUTHOR_PRINT_LEN = 25
@@ -22,20 +27,73 @@ def strfdelta(remainder, fmt="{D:02.0f}d {H:02.0f}h {M:02.0f}m", inputtype="time
     return f.format(fmt, **values)
 
 
-def calculate_stats(categories, include_categories=[], exclude_categories=[]):
+def author_order(author):
+    return (author.name, author.load_id)
+
+
+def topic_order(topic):
+    return (topic.title, topic.url)
+
+
+def top_rows(rows, k, tie):
+    # The k [item, value] rows with the largest values, equal values ordered by tie(item). A k sized heap instead of
+    # sorting every row, since only the shown rows are ever used.
+    return heapq.nsmallest(k, rows, key=lambda row: (-row[1], tie(row[0])))
+
+
+def rank_in(rows, tie):
+    # Rank lookup for a leaderboard: an item's 1-based position is one more than the number of rows top_rows would put
+    # ahead of it, counted in one pass without sorting. None for items that are not on the leaderboard.
+    values = dict(rows)
+
+    def rank(item):
+        if item not in values:
+            return None
+        value, key = values[item], tie(item)
+        return 1 + sum(1 for other, v in values.items() if v > value or (v == value and tie(other) < key))
+
+    return rank
+
+
+def longest_words(posts, k):
+    # The k longest words of the posts, longest first and then alphabetically, with the rank of every long word. Words
+    # come from the posts' word ids in one pass, links are only built for the words that make the leaderboard.
+    posts = list(posts)
+    by_word = defaultdict(list)
+    for word_id, i in long_words(posts):
+        by_word[word_id].append(posts[i])
+    ordered = sorted(by_word, key=lambda word_id: (-VOCAB.lengths[word_id], VOCAB.words[word_id]))
+    rows = []
+    for word_id in ordered[:k]:
+        # Oldest use first
+        p_list = sorted(by_word[word_id], key=lambda p: (p.timestamp, p.load_id))
+        w = VOCAB.words[word_id]
+        rows.append(
+            [
+                ", ".join(f'<a href="{p.author.url}"> {p.author.name} </a>' for p in p_list),
+                ", ".join(f'<a href="{p.topic.url}"> {p.topic.title} </a>' for p in p_list),
+                w,
+                len(w),
+            ]
+        )
+    ranks = {VOCAB.words[word_id]: position + 1 for position, word_id in enumerate(ordered)}
+    return rows, ranks.get
+
+
+def calculate_stats(categories, include_categories=[], exclude_categories=[], limit=None):
+    # Each leaderboard only keeps its top rows (its PRINT_LEN, or `limit` when given) since those are the only rows that
+    # get printed or rendered; leaderboard.rank still finds any author's or topic's position.
     # ====== Helper Functions ======
-    def data(type, func, cond=lambda x: True):
+    def data(title, headers, type, func, print_len, fmt=None):
         if type == "a":
-            l = authors
+            l, tie = authors, author_order
         elif type == "t":
-            l = ftopics
-        return sorted([[i, func(i)] for i in l if cond(i)], key=lambda x: -x[1])
-
-    def topic_time_span(topic):
-        posts = [p for p in topic.posts]
-        sorted_posts = sorted(posts, key=lambda post: post.datetime)
-        time = (sorted_posts[-1].datetime - sorted_posts[0].datetime).total_seconds() if len(posts) > 1 else 0
-        return time
+            l, tie = ftopics, topic_order
+        rows = [[i, func(i)] for i in l]
+        top = top_rows(rows, print_len if limit is None else limit, tie)
+        if fmt is not None:
+            top = [[i, fmt(value)] for i, value in top]
+        return leaderboard(title, headers, top, print_len, rank=rank_in(rows, tie))
 
     # ====== Filtering Data ======
     print("\nCalculating statistics for leaderboard with conditions:")
@@ -60,8 +118,8 @@ def calculate_stats(categories, include_categories=[], exclude_categories=[]):
     for t in topics:
         if len(t.posts) > MIN_POSTS:
             ftopics.add(t)
-            topic_word_counts[t] = sum(val for p in t.posts for val in p.words.values())
-            topic_word_lengths[t] = sum(len(w) * c for p in t.posts for w, c in p.words.items()) / topic_word_counts[t]
+            topic_word_counts[t] = sum(p.word_count for p in t.posts)
+            topic_word_lengths[t] = sum(p.char_count for p in t.posts) / topic_word_counts[t]
             topic_post_lengths[t] = sum(p.word_count for p in t.posts) / len(t.posts)
 
     author_posts = defaultdict(list)
@@ -73,7 +131,7 @@ def calculate_stats(categories, include_categories=[], exclude_categories=[]):
         # pre-apply minimum membership filters, saves on computation time
         if post_count > MIN_POSTS:
             author_word_counts[a] = sum([p.word_count for p in a.posts])
-            author_word_lens[a] = sum(len(w) * c for post in a.posts for w, c in post.words.items()) / author_word_counts[a]
+            author_word_lens[a] = sum(post.char_count for post in a.posts) / author_word_counts[a]
             author_posts[a] = [p for p in a.posts]
             author_post_lens[a] = sum(p.word_count for p in author_posts[a]) / len(author_posts[a])
         else:
@@ -103,58 +161,44 @@ def calculate_stats(categories, include_categories=[], exclude_categories=[]):
 
     print("Summary Calculations complete.")
     # ====== Data for Authors ======
-    aposts = data("a", lambda a: len(author_posts[a]))
-    atopics = data("a", lambda a: len([t for t in a.new_threads if t in topics]))
-    awords = data("a", lambda a: author_word_counts[a])
-    aword_len = data("a", lambda a: author_word_lens[a])
-    apost_len = data("a", lambda a: author_post_lens[a])
-    aposts_by_topic = data("a", lambda a: len(author_posts[a]) / len({p.topic for p in author_posts[a]}))
+    leaderboards = [
+        data("Most Topics by Author", ["Author", "Count"], "a", lambda a: len([t for t in a.new_threads if t in topics]), AUTHOR_PRINT_LEN),
+        data("Most Posts by Author", ["Author", "Count"], "a", lambda a: len(author_posts[a]), AUTHOR_PRINT_LEN),
+        data("Most Words by Author", ["Author", "Count"], "a", lambda a: author_word_counts[a], AUTHOR_PRINT_LEN),
+        data("Longest Avg Word by Author (Minimum 5 Posts)", ["Authors", "Word Length"], "a", lambda a: author_word_lens[a], AUTHOR_PRINT_LEN),
+        data("Highest Avg Word per Post by Author (Minimum 5 Posts)", ["Author", "Word Count"], "a", lambda a: author_post_lens[a], AUTHOR_PRINT_LEN),
+        data(
+            "Most Average Posts per Topic by Author",
+            ["Author", "Avg Posts"],
+            "a",
+            lambda a: len(author_posts[a]) / len({p.topic for p in author_posts[a]}),
+            AUTHOR_PRINT_LEN,
+        ),
+    ]
     print("Author Calculations complete.")
 
     # ====== Data for Topics ======
-    twords = data("t", lambda t: topic_word_counts[t])
-    tposts = data("t", lambda t: len(t.posts))
-    tauthors = data("t", lambda t: len({p.author for p in t.posts}))
-    twordlen = data("t", lambda t: topic_word_lengths[t])
-    tpostlen = data("t", lambda t: topic_post_lengths[t])
-    ttime = data("t", topic_time_span)
-    ttime = [[t[0], strfdelta(t[1])] for t in ttime]
+    leaderboards += [
+        data("Most Words by Topic", ["Topic", "Word Count"], "t", lambda t: topic_word_counts[t], TOPIC_PRINT_LEN),
+        data("Most Posts by Topic", ["Topic", "Post Count"], "t", lambda t: len(t.posts), TOPIC_PRINT_LEN),
+        data("Most Posters by Topic", ["Topic", "Author Count"], "t", lambda t: len({p.author for p in t.posts}), TOPIC_PRINT_LEN),
+        data(
+            f"Longest Avg Word by Topic (Minimum {MIN_POSTS} Posts)", ["Topic", "Word Length"], "t", lambda t: topic_word_lengths[t], TOPIC_PRINT_LEN
+        ),
+        data(
+            f"Highest Avg Word per Post by Topic (Minimum {MIN_POSTS} Posts)",
+            ["Topic", "Words Per Post"],
+            "t",
+            lambda t: topic_post_lengths[t],
+            TOPIC_PRINT_LEN,
+        ),
+        data("Longest Time Active by Topic", ["Topic", "Time Span"], "t", lambda t: t.time_span(), TOPIC_PRINT_LEN, fmt=strfdelta),
+    ]
     print("Topic Calculations complete.\n")
 
     # ====== Data for Words ======
-    w_by_p = defaultdict(set)
-    for p in posts:
-        for w in p.words.keys():
-            if len(w) > 10:
-                w_by_p[w].add(p)
-    lwords = sorted(
-        [
-            [
-                ", ".join(f'<a href="{p.author.url}"> {p.author.name} </a>' for p in p_list),
-                ", ".join(f'<a href="{p.topic.url}"> {p.topic.title} </a>' for p in p_list),
-                w,
-                len(w),
-            ]
-            for w, p_list in w_by_p.items()
-        ],
-        key=lambda x: -x[3],
-    )
-
-    leaderboards = [
-        leaderboard("Most Topics by Author", ["Author", "Count"], atopics, AUTHOR_PRINT_LEN),
-        leaderboard("Most Posts by Author", ["Author", "Count"], aposts, AUTHOR_PRINT_LEN),
-        leaderboard("Most Words by Author", ["Author", "Count"], awords, AUTHOR_PRINT_LEN),
-        leaderboard("Longest Avg Word by Author (Minimum 5 Posts)", ["Authors", "Word Length"], aword_len, AUTHOR_PRINT_LEN),
-        leaderboard("Highest Avg Word per Post by Author (Minimum 5 Posts)", ["Author", "Word Count"], apost_len, AUTHOR_PRINT_LEN),
-        leaderboard("Most Average Posts per Topic by Author", ["Author", "Avg Posts"], aposts_by_topic, AUTHOR_PRINT_LEN),
-        leaderboard("Most Words by Topic", ["Topic", "Word Count"], twords, TOPIC_PRINT_LEN),
-        leaderboard("Most Posts by Topic", ["Topic", "Post Count"], tposts, TOPIC_PRINT_LEN),
-        leaderboard("Most Posters by Topic", ["Topic", "Author Count"], tauthors, TOPIC_PRINT_LEN),
-        leaderboard(f"Longest Avg Word by Topic (Minimum {MIN_POSTS} Posts)", ["Topic", "Word Length"], twordlen, TOPIC_PRINT_LEN),
-        leaderboard(f"Highest Avg Word per Post by Topic (Minimum {MIN_POSTS} Posts)", ["Topic", "Words Per Post"], tpostlen, TOPIC_PRINT_LEN),
-        leaderboard("Longest Time Active by Topic", ["Topic", "Time Span"], ttime, TOPIC_PRINT_LEN),
-        leaderboard("Longest Words", ["Authors", "Topics", "Words", "Length"], lwords, TOPIC_PRINT_LEN),
-    ]
+    lwords, word_rank = longest_words(posts, TOPIC_PRINT_LEN if limit is None else limit)
+    leaderboards.append(leaderboard("Longest Words", ["Authors", "Topics", "Words", "Length"], lwords, TOPIC_PRINT_LEN, rank=word_rank))
 
     # ====== Return the Results ======
     return {
@@ -187,6 +231,14 @@ def nice_format(item):
     return item
 
 
+def formatted(l):
+    # Copy of a leaderboard holding its shown rows as display strings. Built once per leaderboard and shared by
+    # print_stats and every render; l.data itself is never changed.
+    if l.formatted is None:
+        l.formatted = leaderboard(l.title, l.headers, [[nice_format(item) for item in row] for row in l.data[: l.PRINT_LEN]], l.PRINT_LEN)
+    return l.formatted
+
+
 def print_stats(stats, title):
     print(f"\n{'='*40}")
     print(f" {title} ")
@@ -196,23 +248,80 @@ def print_stats(stats, title):
     print("\nLeaderboard Details:\n")
     for l in stats["leaderboards"]:
         print(l.title)
-        for i, row in enumerate(l.data):
-            for j, item in enumerate(row):
-                l.data[i][j] = nice_format(item)
-        table_data = [[i + 1, *row] for i, row in enumerate(l.data[: l.PRINT_LEN])]
+        table_data = [[i + 1, *row] for i, row in enumerate(formatted(l).data)]
         print(tabulate(table_data, headers=l.headers, tablefmt="fancy_grid"))
         print()
 
 
+TEMPLATE_DIR = "web/templates"
+RENDER_CACHE_DIR = "web/.cache"
+_environment = None
+_manifest = None
+_manifest_lock = threading.Lock()
+
+
+def environment():
+    # One environment for every render. Compiled templates stay in memory, and their bytecode is kept in
+    # RENDER_CACHE_DIR so later runs skip compiling them as well.
+    global _environment
+    if _environment is None:
+        os.makedirs(RENDER_CACHE_DIR, exist_ok=True)
+        _environment = Environment(loader=FileSystemLoader(TEMPLATE_DIR), bytecode_cache=FileSystemBytecodeCache(RENDER_CACHE_DIR))
+    return _environment
+
+
+def render_digest(template_name, context):
+    # Every template is hashed since extends/include can pull in any of them
+    digest = hashlib.sha1(template_name.encode())
+    for name in sorted(os.listdir(TEMPLATE_DIR)):
+        with open(os.path.join(TEMPLATE_DIR, name), "rb") as f:
+            digest.update(f.read())
+    digest.update(json.dumps(context, sort_keys=True, default=vars).encode())
+    return digest.hexdigest()
+
+
+def rendered_manifest():
+    # output path -> digest of what it was last rendered from
+    global _manifest
+    if _manifest is None:
+        path = os.path.join(RENDER_CACHE_DIR, "rendered.json")
+        _manifest = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf8") as f:
+                _manifest = json.load(f)
+    return _manifest
+
+
+def write_atomic(path, text):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
 def render_to_file(template_name, output_file, root="web/pages/", **context):
+    # Returns whether the page was written. A page is skipped when it exists and its templates and inputs are the same
+    # as when it was last written.
     if "leaderboards" in context:
-        for l in context["leaderboards"]:
-            for i, row in enumerate(l.data):
-                for j, item in enumerate(row):
-                    l.data[i][j] = nice_format(item)
-
-    env = Environment(loader=FileSystemLoader("web/templates"))
-    template = env.get_template(template_name)
-    output = template.render(**context)
-    with open(f"{root}{output_file}", "w", encoding="utf8") as f:
-        f.write(output)
+        context["leaderboards"] = [formatted(l) for l in context["leaderboards"]]
+    path = f"{root}{output_file}"
+    digest = render_digest(template_name, context)
+    manifest = rendered_manifest()
+    if os.path.exists(path) and manifest.get(path) == digest:
+        return False
+
+    output = environment().get_template(template_name).render(**context)
+    write_atomic(path, output)
+    with _manifest_lock:
+        manifest[path] = digest
+        os.makedirs(RENDER_CACHE_DIR, exist_ok=True)
+        write_atomic(os.path.join(RENDER_CACHE_DIR, "rendered.json"), json.dumps(manifest, indent=1, sort_keys=True))
+    return True
+
+
+def render_pages(pages, workers=4):
+    # pages are dicts of render_to_file arguments, rendered on a thread pool
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        written = list(executor.map(lambda page: render_to_file(**page), pages))
+    print(f"Rendered {sum(written)} of {len(pages)} pages, {len(pages) - sum(written)} unchanged.")
+    return written
@@ -0,0 +1,467 @@
+import datetime
+import numpy as np
+from models import leaderboard, VOCAB, EPOCH
+from aggregates import aggregateCache, COLUMNS
+from metrics import METRICS
+from stats import MIN_POSTS, AUTHOR_PRINT_LEN, TOPIC_PRINT_LEN, strfdelta
+
+
+def top_k(values, k, ties):
+    # Indices of the k largest values, equal values ordered by ascending `ties` so every run ranks them the same way.
+    # argpartition finds the k-th value, then only the rows at or above it are sorted.
+    if k is None or k >= len(values):
+        candidates = np.arange(len(values))
+    else:
+        kth = values[np.argpartition(-values, k - 1)[k - 1]]
+        candidates = np.flatnonzero(values >= kth)
+    return candidates[np.lexsort((ties[candidates], -values[candidates]))][:k]
+
+
+def rank_in(objects, ties, values):
+    # Rank lookup for a leaderboard: one plus the number of rows top_k would put ahead of the item, without sorting
+    def rank(item):
+        if item not in objects:
+            return None
+        i = objects.index(item)
+        return 1 + int(np.count_nonzero((values > values[i]) | ((values == values[i]) & (ties < ties[i]))))
+
+    return rank
+
+
+def sorted_unique(values):
+    # np.unique for values that are already sorted
+    return values[np.concatenate(([True], values[1:] != values[:-1]))] if len(values) else values
+
+
+def first_rows(*columns):
+    # Mask of the first row of every distinct combination of the columns' values
+    order = np.lexsort(columns[::-1])
+    changed = np.zeros(max(len(order) - 1, 0), dtype=bool)
+    for column in columns:
+        changed |= np.diff(column[order]) != 0
+    mask = np.zeros(len(order), dtype=bool)
+    mask[order[np.concatenate(([True], changed))[: len(order)]]] = True
+    return mask
+
+
+def name_ranks(keys):
+    # Position of each key in sorted order, used as the tie-breaker for top_k
+    ranks = np.empty(len(keys), dtype=np.int64)
+    ranks[sorted(range(len(keys)), key=keys.__getitem__)] = np.arange(len(keys))
+    return ranks
+
+
+def view_name(view):
+    # The metrics stage name of a calculate_stats view
+    if view.get("include_categories"):
+        return "stats: only " + ", ".join(view["include_categories"])
+    if view.get("exclude_categories"):
+        return "stats: excluding " + ", ".join(view["exclude_categories"])
+    return "stats: all categories"
+
+
+def epoch_seconds(moment):
+    return int((moment - EPOCH).total_seconds())
+
+
+def time_windows(first, last, days=(7, 30, 365)):
+    # (title, output name, start, end) of the trailing windows ending with the newest post, then of every calendar month
+    # from the oldest post's to the newest's. Windows hold the posts with start <= timestamp < end. They end at the
+    # newest post rather than at the current time, since post times are forum local time and a crawl is not live.
+    windows = [(f"Last {d} Days", f"last_{d}_days", last + 1 - d * 86400, last + 1) for d in days]
+    month = (EPOCH + datetime.timedelta(seconds=first)).replace(day=1, hour=0, minute=0, second=0)
+    while epoch_seconds(month) <= last:
+        following = (month + datetime.timedelta(days=32)).replace(day=1)
+        windows.append((month.strftime("%B %Y"), month.strftime("month_%Y_%m"), epoch_seconds(month), epoch_seconds(following)))
+        month = following
+    return windows
+
+
+class timeIndex:
+    # Every post of a statsEngine as flat (time, author, topic, words, chars) columns, grouped by category and in time
+    # order within each category, with running word totals. The posts of any window in a category are one
+    # contiguous range found by binary search, and their totals two lookups in the running sums, so a window's
+    # leaderboards take one pass over just the posts inside it.
+    def __init__(self, engine):
+        rows = np.flatnonzero(engine.category_unique)
+        category = engine.topic_category[engine.post_topic[rows]]
+        order = np.lexsort((engine.post_time[rows], category))
+        rows = rows[order]
+        self.time, self.author, self.topic, self.words, self.chars = (
+            column[rows] for column in (engine.post_time, engine.post_author, engine.post_topic, engine.post_words, engine.post_chars)
+        )
+        self.bounds = np.searchsorted(category[order], np.arange(len(engine.categories) + 1)).tolist()
+        self.running_words = np.concatenate(([0], np.cumsum(self.words)))
+        # who started each topic, and the long word rows in the order they were posted
+        self.starter = np.array(
+            [engine.author_index.get(t.author.load_id, -1) if t.author is not None else -1 for t in engine.topics], dtype=np.int64
+        )
+        lw_time = engine.post_time[engine.lw_post]
+        self.lw_order = np.argsort(lw_time, kind="stable")
+        self.lw_time = lw_time[self.lw_order]
+
+    def long_word_rows(self, start, end):
+        # The long word rows (engine.lw_*) of the posts in the window
+        first, last = np.searchsorted(self.lw_time, [start, end])
+        return self.lw_order[first:last]
+
+    def ranges(self, start, end):
+        # (lo, hi) row range of each category's posts in the window
+        spans = []
+        for lo, hi in zip(self.bounds, self.bounds[1:]):
+            first, last = np.searchsorted(self.time[lo:hi], [start, end])
+            spans.append((lo + int(first), lo + int(last)))
+        return spans
+
+
+class statsEngine:
+    # Flat numpy tables over every topic and author, built once and shared by every view. They are filled from the
+    # per-category aggregates of an aggregateCache: topic metrics only depend on the topic's own posts and author metrics
+    # on all of an author's posts, so a topic's row comes from its category and an author's row is the sum over all
+    # categories. What depends on the view (which topics and authors it holds, and each author's new threads) is kept
+    # per category, and a view only adds up the rows of its categories.
+    def __init__(self, categories, cache=None, authors=None):
+        self.categories = list(categories)
+        self.category_titles = [c.title for c in self.categories]
+        self.cache = aggregateCache() if cache is None else cache
+        self.cache.update(self.categories, authors)
+
+        # Every post row of every category's aggregate, topic after topic, with topic and author ids made global. A
+        # topic only ever sits in its own category's topic set, so each topic gets one category.
+        self.topics, topic_category, topic_start = [], [], []
+        author_ids = {}
+        columns = {name: [] for name in COLUMNS}
+        post_topic, lw_word, lw_post = [], [], []
+        rows = 0
+        for ci, c in enumerate(self.categories):
+            aggregate = self.cache.categories[c.load_id]
+            by_id = {t.load_id: t for t in c.topics}
+            counts = np.diff(aggregate.bounds)
+            post_topic.append(len(self.topics) + np.repeat(np.arange(len(counts)), counts))
+            lw_post.append(rows + aggregate.bounds[np.repeat(np.arange(len(counts)), np.diff(aggregate.lw_bounds))] + aggregate.lw_post)
+            lw_word.append(aggregate.lw_word)
+            self.topics.extend(by_id[load_id] for load_id in aggregate.topic_ids)
+            topic_category.extend([ci] * len(counts))
+            topic_start.append(rows + aggregate.bounds[:-1])
+            present = np.unique(aggregate.columns["author"])
+            lookup = np.zeros(len(aggregate.authors), dtype=np.int64)
+            lookup[present] = [author_ids.setdefault(aggregate.authors[i], len(author_ids)) for i in present.tolist()]
+            for name in COLUMNS:
+                columns[name].append(lookup[aggregate.columns[name]] if name == "author" else aggregate.columns[name])
+            rows += int(aggregate.bounds[-1])
+        self.topic_index = {t: i for i, t in enumerate(self.topics)}
+        self.authors = [self.cache.authors[load_id] for load_id in author_ids]
+        self.author_index = author_ids
+        n_topics, n_authors, n_categories = len(self.topics), len(self.authors), len(self.categories)
+        keys, self.post_author, self.post_time, self.post_words, self.post_chars = (
+            np.concatenate(columns[name] + [np.zeros(0, dtype=np.int64)]) for name in COLUMNS
+        )
+        self.post_topic = np.concatenate(post_topic + [np.zeros(0, dtype=np.int64)])
+        self.topic_category = np.array(topic_category, dtype=np.int64)
+        self.topic_start = np.concatenate(topic_start + [np.zeros(0, dtype=np.int64)])
+        post_category = self.topic_category[self.post_topic]
+
+        # Topic metrics come from all of a topic's posts. Its rows are in time order, so the first and last are its
+        # oldest and newest post.
+        self.topic_posts = np.bincount(self.post_topic, minlength=n_topics)
+        self.topic_words = np.bincount(self.post_topic, weights=self.post_words, minlength=n_topics).astype(np.int64)
+        self.topic_chars = np.bincount(self.post_topic, weights=self.post_chars, minlength=n_topics).astype(np.int64)
+        self.topic_authors = np.bincount(np.unique(self.post_topic * n_authors + self.post_author) // n_authors, minlength=n_topics)
+        has_posts = self.topic_posts > 0
+        self.topic_first, topic_last = np.zeros(n_topics), np.zeros(n_topics)
+        self.topic_first[has_posts] = self.post_time[self.topic_start[has_posts]]
+        topic_last[has_posts] = self.post_time[self.topic_start[has_posts] + self.topic_posts[has_posts] - 1]
+        self.topic_span = np.where(self.topic_posts > 1, topic_last - self.topic_first, 0.0)
+
+        # Posts are sets keyed by load_id, so a post found in two topics (the same text posted twice) is one post: once
+        # per category for what a view counts, once overall for an author's own totals
+        self.category_unique = first_rows(keys, post_category)
+        unique = first_rows(keys)
+        author, topic = self.post_author[unique], self.post_topic[unique]
+        self.author_posts = np.bincount(author, minlength=n_authors)
+        self.author_words = np.bincount(author, weights=self.post_words[unique], minlength=n_authors).astype(np.int64)
+        self.author_chars = np.bincount(author, weights=self.post_chars[unique], minlength=n_authors).astype(np.int64)
+        self.author_topics = np.bincount(np.unique(author * n_topics + topic) // n_topics, minlength=n_authors)
+        self.author_first = np.full(n_authors, np.iinfo(np.int64).max)
+        self.author_last = np.full(n_authors, np.iinfo(np.int64).min)
+        np.minimum.at(self.author_first, author, self.post_time[unique])
+        np.maximum.at(self.author_last, author, self.post_time[unique])
+
+        # Per-category partials: which authors posted in a category, how many threads each of them started there, and
+        # the category's post and word totals
+        self.category_authors = np.zeros((n_categories, n_authors), dtype=bool)
+        self.category_authors[post_category, self.post_author] = True
+        self.category_threads = np.zeros((n_categories, n_authors), dtype=np.int64)
+        for i, t in enumerate(self.topics):
+            if t.author is not None and t.author.load_id in author_ids:
+                self.category_threads[topic_category[i], author_ids[t.author.load_id]] += 1
+        self.category_posts = np.bincount(post_category[self.category_unique], minlength=n_categories)
+        self.category_words = np.bincount(
+            post_category[self.category_unique], weights=self.post_words[self.category_unique], minlength=n_categories
+        ).astype(np.int64)
+
+        # (word, post row, category) rows for every word longer than 10 characters, grouped by word
+        lw_word = np.concatenate(lw_word + [np.zeros(0, dtype=np.uint32)]).astype(np.int64)
+        lw_post = np.concatenate(lw_post + [np.zeros(0, dtype=np.int64)])
+        keep = self.category_unique[lw_post]
+        lw_word, lw_post = lw_word[keep], lw_post[keep]
+        # posts of a word are put in order when shown, so the rows do not need a stable sort
+        order = np.argsort(lw_word)
+        self.lw_word = lw_word[order]
+        self.lw_post = lw_post[order]
+        self.lw_category = post_category[self.lw_post]
+        self.word_lengths = np.frombuffer(VOCAB.lengths, dtype=np.uint32).astype(np.int64)
+        self.resolved = {}  # topic id -> its posts in row order, for the posts the leaderboards show
+
+        # Ties are broken by author name, topic title and url, and by the word itself
+        self.author_ties = name_ranks([(a.name, a.load_id) for a in self.authors])
+        self.topic_ties = name_ranks([(t.title, t.url) for t in self.topics])
+        long_ids = sorted_unique(self.lw_word)
+        self.word_ties = np.zeros(len(self.word_lengths), dtype=np.int64)
+        self.word_ties[long_ids] = name_ranks([VOCAB.words[i] for i in long_ids])
+        self.index = None  # timeIndex, built the first time a time window is asked for
+
+    def post(self, row):
+        # The Post behind a post row. A topic's rows are its posts in (time, load_id) order, and its posts are only
+        # sorted the first time one of them is shown.
+        topic = int(self.post_topic[row])
+        if topic not in self.resolved:
+            self.resolved[topic] = sorted(self.topics[topic].posts, key=lambda p: (p.timestamp, p.load_id))
+        return self.resolved[topic][row - self.topic_start[topic]]
+
+    def view_mask(self, include_categories=[], exclude_categories=[]):
+        # Same category filter as stats.calculate_stats: an include list wins over an exclude list
+        if include_categories:
+            return np.array([title in include_categories for title in self.category_titles], dtype=bool)
+        return np.array([title not in exclude_categories for title in self.category_titles], dtype=bool)
+
+    def calculate_views(self, views, limit=None):
+        # One result per view definition, each a dict of calculate_stats keyword arguments. All views share the tables
+        # built in __init__, so each extra view only costs a few masked sums.
+        results = []
+        for view in views:
+            with METRICS.stage(view_name(view)):
+                results.append(self.calculate_stats(limit=limit, **view))
+        return results
+
+    def calculate_stats(self, include_categories=[], exclude_categories=[], limit=None):
+        # Same values as stats.calculate_stats, but each leaderboard only keeps its top rows (its PRINT_LEN, or
+        # `limit` when given) since those are the only rows that get printed or rendered. Equal values are ordered by
+        # name instead of by set iteration order.
+        print("\nCalculating statistics for leaderboard with conditions:")
+        if include_categories:
+            print(f"Only include: { ', '.join(include_categories) }")
+        elif exclude_categories:
+            print(f"Exclude: {', '.join(exclude_categories)}")
+        else:
+            print("No category filters applied.")
+        in_view = self.view_mask(include_categories, exclude_categories)
+        topic_mask = in_view[self.topic_category]
+        a_idx = np.flatnonzero(self.category_authors[in_view].any(axis=0) & (self.author_posts > MIN_POSTS))
+        t_idx = np.flatnonzero(topic_mask & (self.topic_posts > MIN_POSTS))
+        print(
+            f"Categories: {int(in_view.sum())}, Topics: {int(topic_mask.sum())}, Posts: {int(self.category_posts[in_view].sum())}, Authors: {len(a_idx)}, "
+            f"Filtered Topics: {len(t_idx)}"
+        )
+
+        # ====== Summary Calculations ======
+        total_topics = int(topic_mask.sum())
+        total_posts = int(self.category_posts[in_view].sum())
+        total_words = int(self.category_words[in_view].sum())
+
+        # Author metrics are over all of an author's posts, the view only decides which authors are listed
+        view_threads = self.category_threads[in_view].sum(axis=0)
+        leaderboards = self.leaderboards(
+            a_idx,
+            (view_threads, self.author_posts, self.author_words, self.author_chars, self.author_topics),
+            t_idx,
+            (self.topic_posts, self.topic_words, self.topic_chars, self.topic_authors, self.topic_span),
+            in_view[self.lw_category],
+            limit,
+        )
+
+        return {
+            "summary": {
+                "Total Topics": total_topics,
+                "Total Posts": total_posts,
+                "Total Words": total_words,
+                "Avg Posts per Topic": total_posts / total_topics,
+                "Avg Words per Topic": total_words / total_topics,
+                "Avg Words per Post": total_words / total_posts,
+            },
+            "leaderboards": leaderboards,
+        }
+
+    def time_index(self):
+        if self.index is None:
+            self.index = timeIndex(self)
+        return self.index
+
+    def time_windows(self, days=(7, 30, 365)):
+        index = self.time_index()
+        if not len(index.time):
+            return []
+        return time_windows(int(index.time.min()), int(index.time.max()), days)
+
+    def calculate_windows(self, windows, limit=None, **view):
+        # One calculate_window result per (title, name, start, end) of time_windows
+        with METRICS.stage("stats: time windows"):
+            return [self.calculate_window(start, end, limit=limit, **view) for _, _, start, end in windows]
+
+    def calculate_window(self, start, end, include_categories=[], exclude_categories=[], limit=None):
+        # The leaderboards of calculate_stats over only the posts with start <= timestamp < end. As there, an author's
+        # numbers count their posts in every category and the view decides which authors are listed, and the minimum
+        # post counts apply to the posts in the window.
+        index = self.time_index()
+        in_view = self.view_mask(include_categories, exclude_categories)
+        spans = index.ranges(start, end)
+        n_authors, n_topics = len(self.authors), len(self.topics)
+        rows = np.concatenate([np.arange(lo, hi) for lo, hi in spans] + [np.zeros(0, dtype=np.int64)])
+        view_rows = np.concatenate([np.arange(lo, hi) for (lo, hi), keep in zip(spans, in_view) if keep] + [np.zeros(0, dtype=np.int64)])
+
+        author, topic = index.author[rows], index.topic[rows]
+        author_posts = np.bincount(author, minlength=n_authors)
+        author_words = np.bincount(author, weights=index.words[rows], minlength=n_authors).astype(np.int64)
+        author_chars = np.bincount(author, weights=index.chars[rows], minlength=n_authors).astype(np.int64)
+        author_topics = np.bincount(np.unique(author * n_topics + topic) // n_topics, minlength=n_authors)
+        listed = np.bincount(index.author[view_rows], minlength=n_authors) > 0
+        started = (index.starter >= 0) & (self.topic_first >= start) & (self.topic_first < end) & in_view[self.topic_category]
+        threads = np.bincount(index.starter[started], minlength=n_authors)
+
+        v_author, v_topic, v_time = index.author[view_rows], index.topic[view_rows], index.time[view_rows].astype(np.float64)
+        topic_posts = np.bincount(v_topic, minlength=n_topics)
+        topic_words = np.bincount(v_topic, weights=index.words[view_rows], minlength=n_topics).astype(np.int64)
+        topic_chars = np.bincount(v_topic, weights=index.chars[view_rows], minlength=n_topics).astype(np.int64)
+        topic_authors = np.bincount(np.unique(v_topic * n_authors + v_author) // n_authors, minlength=n_topics)
+        first, last = np.full(n_topics, np.inf), np.full(n_topics, -np.inf)
+        np.minimum.at(first, v_topic, v_time)
+        np.maximum.at(last, v_topic, v_time)
+        topic_span = np.where(topic_posts > 1, last - first, 0.0)
+
+        a_idx = np.flatnonzero(listed & (author_posts > MIN_POSTS))
+        t_idx = np.flatnonzero(topic_posts > MIN_POSTS)
+        lw_rows = index.long_word_rows(start, end)
+        lw_mask = np.zeros(len(self.lw_word), dtype=bool)
+        lw_mask[lw_rows[in_view[self.lw_category[lw_rows]]]] = True
+        leaderboards = self.leaderboards(
+            a_idx,
+            (threads, author_posts, author_words, author_chars, author_topics),
+            t_idx,
+            (topic_posts, topic_words, topic_chars, topic_authors, topic_span),
+            lw_mask,
+            limit,
+        )
+
+        total_topics = int(np.count_nonzero(topic_posts))
+        total_posts = sum(hi - lo for (lo, hi), keep in zip(spans, in_view) if keep)
+        total_words = int(sum(index.running_words[hi] - index.running_words[lo] for (lo, hi), keep in zip(spans, in_view) if keep))
+        return {
+            "summary": {
+                "Total Topics": total_topics,
+                "Total Posts": total_posts,
+                "Total Words": total_words,
+                "Avg Posts per Topic": total_posts / total_topics if total_topics else 0,
+                "Avg Words per Topic": total_words / total_topics if total_topics else 0,
+                "Avg Words per Post": total_words / total_posts if total_posts else 0,
+            },
+            "leaderboards": leaderboards,
+        }
+
+    def leaderboards(self, a_idx, author_values, t_idx, topic_values, lw_mask, limit=None):
+        # Every leaderboard from full length value arrays: author_values are (threads, posts, words, chars, topics) per
+        # author and topic_values (posts, words, chars, authors, time span) per topic, a_idx and t_idx the rows to rank,
+        # and lw_mask the long word rows (self.lw_*) to take words from
+        threads, author_posts, author_words, author_chars, author_topics = author_values
+        authors, a_ties = [self.authors[i] for i in a_idx], self.author_ties[a_idx]
+        a_posts = author_posts[a_idx]
+        a_words = author_words[a_idx]
+
+        def board(title, headers, objects, ties, values, print_len, cast, fmt=None):
+            order = top_k(values, print_len if limit is None else limit, ties)
+            data = [[objects[i], cast(values[i]) if fmt is None else fmt(values[i])] for i in order]
+            return leaderboard(title, headers, data, print_len, rank=rank_in(objects, ties, values))
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            leaderboards = [
+                board("Most Topics by Author", ["Author", "Count"], authors, a_ties, threads[a_idx], AUTHOR_PRINT_LEN, int),
+                board("Most Posts by Author", ["Author", "Count"], authors, a_ties, a_posts, AUTHOR_PRINT_LEN, int),
+                board("Most Words by Author", ["Author", "Count"], authors, a_ties, a_words, AUTHOR_PRINT_LEN, int),
+                board(
+                    "Longest Avg Word by Author (Minimum 5 Posts)",
+                    ["Authors", "Word Length"],
+                    authors,
+                    a_ties,
+                    author_chars[a_idx] / a_words,
+                    AUTHOR_PRINT_LEN,
+                    float,
+                ),
+                board(
+                    "Highest Avg Word per Post by Author (Minimum 5 Posts)",
+                    ["Author", "Word Count"],
+                    authors,
+                    a_ties,
+                    a_words / a_posts,
+                    AUTHOR_PRINT_LEN,
+                    float,
+                ),
+                board(
+                    "Most Average Posts per Topic by Author",
+                    ["Author", "Avg Posts"],
+                    authors,
+                    a_ties,
+                    a_posts / author_topics[a_idx],
+                    AUTHOR_PRINT_LEN,
+                    float,
+                ),
+            ]
+
+            # ====== Data for Topics ======
+            topic_posts, topic_words, topic_chars, topic_authors, topic_span = topic_values
+            ftopics, t_ties = [self.topics[i] for i in t_idx], self.topic_ties[t_idx]
+            t_words = topic_words[t_idx]
+            leaderboards += [
+                board("Most Words by Topic", ["Topic", "Word Count"], ftopics, t_ties, t_words, TOPIC_PRINT_LEN, int),
+                board("Most Posts by Topic", ["Topic", "Post Count"], ftopics, t_ties, topic_posts[t_idx], TOPIC_PRINT_LEN, int),
+                board("Most Posters by Topic", ["Topic", "Author Count"], ftopics, t_ties, topic_authors[t_idx], TOPIC_PRINT_LEN, int),
+                board(
+                    f"Longest Avg Word by Topic (Minimum {MIN_POSTS} Posts)",
+                    ["Topic", "Word Length"],
+                    ftopics,
+                    t_ties,
+                    topic_chars[t_idx] / t_words,
+                    TOPIC_PRINT_LEN,
+                    float,
+                ),
+                board(
+                    f"Highest Avg Word per Post by Topic (Minimum {MIN_POSTS} Posts)",
+                    ["Topic", "Words Per Post"],
+                    ftopics,
+                    t_ties,
+                    t_words / topic_posts[t_idx],
+                    TOPIC_PRINT_LEN,
+                    float,
+                ),
+                board("Longest Time Active by Topic", ["Topic", "Time Span"], ftopics, t_ties, topic_span[t_idx], TOPIC_PRINT_LEN, float, strfdelta),
+            ]
+
+        # ====== Data for Words ======
+        long_words = sorted_unique(self.lw_word[lw_mask])
+        word_lengths, word_ties = self.word_lengths[long_words], self.word_ties[long_words]
+        lwords = []
+        for word_id in long_words[top_k(word_lengths, TOPIC_PRINT_LEN if limit is None else limit, word_ties)]:
+            start, stop = np.searchsorted(self.lw_word, [word_id, word_id + 1])
+            posts = [self.post(i) for i, keep in zip(self.lw_post[start:stop], lw_mask[start:stop]) if keep]
+            # Oldest use first, whatever order the posts were folded into the aggregates in
+            posts.sort(key=lambda p: (p.timestamp, p.load_id))
+            word = VOCAB.words[word_id]
+            lwords.append(
+                [
+                    ", ".join(f'<a href="{p.author.url}"> {p.author.name} </a>' for p in posts),
+                    ", ".join(f'<a href="{p.topic.url}"> {p.topic.title} </a>' for p in posts),
+                    word,
+                    len(word),
+                ]
+            )
+        word_rank = rank_in([VOCAB.words[i] for i in long_words], word_ties, word_lengths)
+        leaderboards.append(leaderboard("Longest Words", ["Authors", "Topics", "Words", "Length"], lwords, TOPIC_PRINT_LEN, rank=word_rank))
+        return leaderboards
@@ -0,0 +1,139 @@
+import html
+import zlib
+import random
+import hashlib
+import datetime
+from itertools import accumulate
+from pagestore import pageStore, normalize_url, legacy_name
+
+CATEGORY_NAMES = ["General", "Fun & Games", "Tournaments", "Announcements", "Novice Corner", "Rules & Resources", "Judging", "Off Topic"]
+SYLLABLES = ["ar", "ba", "de", "gu", "ment", "ion", "op", "po", "si", "tion", "re", "but", "tal", "ju", "dge", "mo", "ve", "con", "ex", "ist"]
+START = datetime.datetime(2015, 1, 1)
+END = datetime.datetime(2025, 1, 1)
+
+
+def make_vocabulary(rng, size=3000):
+    # Pseudo-words of 1 to 6 syllables, so some are longer than the 10 characters Longest Words looks for. Weighted
+    # by a Zipf law like real text, the first few words make up most of every post.
+    words = sorted({"".join(rng.choice(SYLLABLES) for _ in range(rng.choice([1, 1, 2, 2, 2, 3, 3, 4, 5, 6]))) for _ in range(size * 2)})
+    rng.shuffle(words)
+    words = words[:size]
+    return words, list(accumulate(1 / (rank + 1) for rank in range(len(words))))
+
+
+def forum_time(moment):
+    # Same text the forum shows, e.g. "March 5, 2021, 10:15 pm"
+    hour = moment.hour % 12 or 12
+    return f"{moment:%B} {moment.day}, {moment.year}, {hour}:{moment.minute:02d} {'am' if moment.hour < 12 else 'pm'}"
+
+
+def page(body):
+    return f"<!DOCTYPE html><html><head><title>Forum</title></head><body><div id='content'>{body}</div></body></html>"
+
+
+def pagination(urls):
+    if len(urls) < 2:
+        return ""
+    return "<div class='pages-and-menu'><div class='pages'>" + "".join(f"<a href='{u}'>{i + 1}</a>" for i, u in enumerate(urls)) + "</div></div>"
+
+
+def page_urls(url, count):
+    return [url] + [f"{url}?part={i + 1}" for i in range(1, count)]
+
+
+class syntheticForum:
+    # A deterministic stand-in for apda.online: the same seed and size always give the same pages, in the markup
+    # parse.extract reads. Topic and author sizes are skewed like a real forum's. Pages are generated one at a time,
+    # each topic from its own seeded generator, so even a million post forum never has to be held in memory.
+    def __init__(self, posts=10000, categories=6, seed=0, posts_per_page=15, topics_per_page=20, origin="https://apda.online/forum/"):
+        self.posts = posts
+        self.seed = seed
+        self.posts_per_page = posts_per_page
+        self.topics_per_page = topics_per_page
+        self.origin = origin
+        rng = random.Random(seed)
+        self.words, self.word_weights = make_vocabulary(rng)
+        self.authors = [f"debater{i}" for i in range(max(10, posts // 40))]
+        self.author_weights = list(accumulate(1 / (rank + 1) ** 0.8 for rank in range(len(self.authors))))
+        self.categories = [CATEGORY_NAMES[i] if i < len(CATEGORY_NAMES) else f"Category {i + 1}" for i in range(categories)]
+        category_weights = list(accumulate(1 / (rank + 1) for rank in range(categories)))
+
+        # (category index, post count) per topic, the counts adding up to exactly `posts`
+        self.topics = []
+        remaining = posts
+        while remaining:
+            size = min(remaining, 1 + int(rng.expovariate(1 / 25)))
+            self.topics.append((rng.choices(range(categories), cum_weights=category_weights)[0], size))
+            remaining -= size
+        self.category_topics = [[t for t, (c, _) in enumerate(self.topics) if c == category] for category in range(categories)]
+
+    def category_url(self, category):
+        return f"{self.origin}forum-{category + 1}/"
+
+    def topic_url(self, topic):
+        return f"{self.origin}topic/{topic + 1}/"
+
+    def topic_posts(self, topic):
+        # [(author or None when deleted, time text, content)], regenerated identically on every call
+        rng = random.Random(hashlib.sha1(f"{self.seed}:{topic}".encode()).digest())
+        moment = START + datetime.timedelta(seconds=rng.randrange(int((END - START).total_seconds())))
+        posts = []
+        for n in range(self.topics[topic][1]):
+            author = None if rng.random() < 0.01 else rng.choices(self.authors, cum_weights=self.author_weights)[0]
+            words = rng.choices(self.words, cum_weights=self.word_weights, k=max(3, int(rng.lognormvariate(3.5, 1))))
+            # Post load_ids are hashes of their content, the closing number keeps every generated post distinct
+            content = " ".join(words).capitalize() + f". #{topic}.{n}"
+            posts.append((author, forum_time(moment), content))
+            moment += datetime.timedelta(minutes=int(rng.expovariate(1 / 600)) + 1)
+        return posts
+
+    def topic_title(self, topic):
+        rng = random.Random(topic * 7919 + self.seed)
+        return " ".join(rng.choices(self.words, cum_weights=self.word_weights, k=rng.randint(2, 6))).capitalize()
+
+    def pages(self):
+        # (url, html) for every page of the forum: the index, each category's listing pages, each topic's pages
+        yield self.origin, page(
+            "".join(f"<a class='forum-title' href='{self.category_url(c)}'>{html.escape(name)}</a>" for c, name in enumerate(self.categories))
+        )
+        for category, topics in enumerate(self.category_topics):
+            chunks = [topics[i : i + self.topics_per_page] for i in range(0, len(topics), self.topics_per_page)] or [[]]
+            urls = page_urls(self.category_url(category), len(chunks))
+            for url, chunk in zip(urls, chunks):
+                rows = "".join(
+                    f"<div class='topic'><div class='topic-name'><a href='{self.topic_url(t)}'>{html.escape(self.topic_title(t))}</a></div>"
+                    f"<div class='topic-stats'>{self.topics[t][1] - 1} replies</div></div>"
+                    for t in chunk
+                )
+                yield url, page(pagination(urls) + rows)
+        for topic in range(len(self.topics)):
+            posts = self.topic_posts(topic)
+            chunks = [posts[i : i + self.posts_per_page] for i in range(0, len(posts), self.posts_per_page)]
+            urls = page_urls(self.topic_url(topic), len(chunks))
+            for number, (url, chunk) in enumerate(zip(urls, chunks)):
+                elements = []
+                for i, (author, time, content) in enumerate(chunk):
+                    first = " first-post" if number == 0 and i == 0 else ""
+                    profile = (
+                        f"<a class='profile-link' href='https://apda.online/profile/{author}/'>{author}</a>"
+                        if author is not None
+                        else "<span>deleted</span>"
+                    )
+                    elements.append(
+                        f"<div class='post-element{first}'>{profile}<div class='forum-post-date'>{time}</div>"
+                        f"<div class='post-message'><p>{html.escape(content)}</p></div></div>"
+                    )
+                yield url, page(pagination(urls) + "".join(elements))
+
+    def write_store(self, path):
+        # Every page into a page store as if it had been crawled, in one transaction. Returns the number of pages.
+        store = pageStore(path)
+        rows = (
+            (normalize_url(url), legacy_name(url), 0, None, None, hashlib.sha1(body).hexdigest(), zlib.compress(body, 6))
+            for url, body in ((url, text.encode("utf-8")) for url, text in self.pages())
+        )
+        with store.lock:
+            count = store.conn.executemany("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?)", rows).rowcount
+            store.conn.commit()
+        store.conn.close()
+        return count
@@ -0,0 +1,18 @@
+import pytest
+from bench import new_data
+from models import pre_compute_posts
+from pagestore import open_store
+from scraper import crawl, scrapeTracker
+from synthetic import syntheticForum
+
+
+@pytest.fixture
+def forum_data(tmp_path):
+    # (categories, topics, posts, authors) of a small synthetic forum, crawled from its page store and pre-computed
+    pages = str(tmp_path / "pages.db")
+    syntheticForum(posts=400, seed=4).write_store(pages)
+    data = new_data()
+    crawl(None, data, scrapeTracker(), store_path=pages)
+    open_store(pages).close()
+    pre_compute_posts(data["posts"].values())
+    return data["categories"].values(), data["topics"].values(), data["posts"].values(), data["authors"]
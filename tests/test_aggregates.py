@@ -0,0 +1,33 @@
+from aggregates import aggregateCache
+from bench import VIEWS
+from models import Post
+from stats_engine import statsEngine
+
+
+def results(engine):
+    # Every view and time window, as the summaries and leaderboard rows the report and pages are made from
+    views = engine.calculate_views(VIEWS) + engine.calculate_windows(engine.time_windows())
+    return [(view["summary"], [(board.title, board.data) for board in view["leaderboards"]]) for view in views]
+
+
+def test_incremental_update_matches_fresh_build(tmp_path, capsys, forum_data):
+    categories, topics, posts, authors = forum_data
+    cache_path = str(tmp_path / "stats_cache.db")
+    assert results(statsEngine(categories, aggregateCache(cache_path))) == results(statsEngine(categories))
+
+    # A post goes from one topic and a new one comes to another, then the persisted cache is loaded and brought up to date
+    topics = sorted(topics, key=lambda t: t.load_id)
+    removed = min(topics[0].posts, key=lambda p: p.load_id)
+    topics[0].remove_post(removed)
+    removed.author.posts.discard(removed)
+    added = Post(topics[1], authors["debater1"], "An incontrovertibly late reply", "June 1, 2025, 12:00 pm")
+    added.pre_compute()
+    topics[1].add_post(added)
+    added.author.posts.add(added)
+
+    capsys.readouterr()
+    cached = statsEngine(categories, aggregateCache(cache_path))
+    # only the two changed topics are folded in again
+    assert f"{len(topics[0].posts) + len(topics[1].posts)} posts of 2 new or changed topics" in capsys.readouterr().out
+    assert results(cached) == results(statsEngine(categories))
+    assert results(statsEngine(categories, aggregateCache(cache_path))) == results(statsEngine(categories))
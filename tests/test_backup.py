@@ -0,0 +1,31 @@
+import pytest
+from backup import save_data, load_data
+
+
+def state(obj):
+    # An object's persisted fields, with the lists that are saved from sets in sorted order
+    return str(sorted((k, sorted(v) if isinstance(v, list) else v) for k, v in obj.__getstate__().items()))
+
+
+def states(categories, topics, posts, authors):
+    return [set(map(state, objects)) for objects in (categories, topics, posts, authors.values())]
+
+
+def test_snapshot_round_trip(tmp_path, forum_data):
+    snapshot = str(tmp_path / "scraped_data.db")
+    expected = states(*forum_data)
+    save_data(*forum_data, file_name=snapshot)
+    loaded = load_data(snapshot)
+    assert states(*loaded) == expected
+
+    bare = load_data(snapshot, content=False)
+    assert all(p.content is None for p in bare[2])
+    assert states(*bare)[:2] == expected[:2]
+    with pytest.raises(ValueError):
+        save_data(*bare, file_name=snapshot)
+
+    # Saved again while every post still reads its text from the memory-mapped content file
+    save_data(*loaded, file_name=snapshot)
+    assert states(*loaded) == expected
+    assert states(*load_data(snapshot)) == expected
+    assert len(list(tmp_path.glob("scraped_data.db.*.content"))) == 1
@@ -0,0 +1,49 @@
+import asyncio
+import pytest
+from bench import new_data, data_graph, serve_store, localSession, stoppingTracker, stopCrawl
+from journal import crawlJournal
+from pagestore import open_store
+from scraper import crawl, crawl_async, scrapeTracker
+from synthetic import syntheticForum
+
+
+@pytest.fixture(scope="module")
+def forum_store(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("forum") / "pages.db")
+    syntheticForum(posts=2000, seed=6).write_store(path)
+    server = serve_store(path)
+    yield path, f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    open_store(path).close()
+
+
+def run(mode, forum_store, data, tracker, journal, cache_path):
+    store_path, origin = forum_store
+    if mode == "sync":
+        crawl(None, data, tracker, store_path=store_path, journal=journal)
+    else:
+        asyncio.run(crawl_async(localSession(origin), data, tracker, concurrency=8, per_host=8, store_path=cache_path, journal=journal))
+        open_store(cache_path).close()
+
+
+@pytest.mark.parametrize("mode", ["sync", "async"])
+@pytest.mark.parametrize("stop_after", [7, 55, 130])
+def test_resumed_crawl_matches_uninterrupted(tmp_path, capsys, forum_store, mode, stop_after):
+    full = new_data()
+    run(mode, forum_store, full, scrapeTracker(), None, str(tmp_path / "full.db"))
+
+    journal_path, cache_path = str(tmp_path / "journal.db"), str(tmp_path / "cache.db")
+    journal = crawlJournal(journal_path, checkpoint_every=10)
+    with pytest.raises(stopCrawl):
+        run(mode, forum_store, new_data(), stoppingTracker(stop_after), journal, cache_path)
+    # Whatever was appended after the last checkpoint is lost, as it would be in a crash
+    journal.conn.close()
+
+    capsys.readouterr()
+    resumed = new_data()
+    journal = crawlJournal(journal_path, checkpoint_every=10)
+    run(mode, forum_store, resumed, scrapeTracker(), journal, cache_path)
+    journal.finish()
+    # before the first checkpoint there is nothing to resume and the crawl starts over
+    assert ("Resuming an interrupted crawl" in capsys.readouterr().out) == (stop_after > 10)
+    assert data_graph(resumed) == data_graph(full)
@@ -0,0 +1,18 @@
+from pagestore import pageStore, migrate_backup_dir, legacy_name
+
+URL = "https://apda.online/forum/topic/1/"
+
+
+def test_migrated_pages_read_back_like_the_old_cache(tmp_path):
+    backup_dir = tmp_path / "backup"
+    backup_dir.mkdir()
+    (backup_dir / legacy_name(URL)).write_bytes(b"<p>one\r\ntwo\rthree</p>")
+    store = pageStore(str(tmp_path / "backup.db"))
+    assert migrate_backup_dir(store, str(backup_dir)) == 1
+    assert store.get(URL) == "<p>one\ntwo\nthree</p>"
+
+
+def test_put_folds_line_breaks(tmp_path):
+    store = pageStore(str(tmp_path / "backup.db"))
+    store.put(URL, "<p>one\r\ntwo</p>")
+    assert store.get(URL) == "<p>one\ntwo</p>"
@@ -0,0 +1,68 @@
+import pytest
+import parse
+from synthetic import syntheticForum
+
+# A topic page as the forum serves it: CRLF line breaks, one of them inside a tag
+TOPIC_LINES = [
+    "<!DOCTYPE html>",
+    "<html><head><title>Forum</title></head><body><div id='content'>",
+    "<div class='pages-and-menu'><div class='pages'><a href='https://apda.online/forum/topic/1/'>1</a>",
+    "<a href='https://apda.online/forum/topic/1/?part=2'>2</a></div></div>",
+    "<div",
+    " class=\"post-element first-post\"><a class='profile-link' href='https://apda.online/profile/alice/'>alice</a>",
+    "<div class='forum-post-date'>March 5, 2021, 10:15 pm</div>",
+    "<div class='post-message'><p>First line",
+    "second line</p></div></div>",
+    "<div class='post-element'><span>deleted</span><div class='forum-post-date'>March 6, 2021, 9:00 am</div>",
+    "<div class='post-message'><p>Old\rMac line</p></div></div>",
+    "</div></body></html>",
+]
+
+
+def crlf_page():
+    return "\r\n".join(TOPIC_LINES)
+
+
+@pytest.mark.parametrize("backend", sorted(parse.BACKENDS))
+def test_crlf_page(backend):
+    record = parse.extract(crlf_page(), backend)
+    assert record.first_post
+    assert record.first_author == ("alice", "https://apda.online/profile/alice/")
+    assert record.posts == [
+        ("alice", "https://apda.online/profile/alice/", "March 5, 2021, 10:15 pm", "First line\nsecond line"),
+        (None, None, "March 6, 2021, 9:00 am", "Old\nMac line"),
+    ]
+    assert record.pages == ["https://apda.online/forum/topic/1/", "https://apda.online/forum/topic/1/?part=2"]
+
+
+def test_crlf_matches_lf():
+    assert parse.extract(crlf_page()) == parse.extract("\n".join(TOPIC_LINES).replace("\r", "\n"))
+
+
+POST = (
+    "<div class='post-element'><a class='profile-link' href='https://apda.online/profile/zoe/'>zoë</a>"
+    "<div class='forum-post-date'>March 5, 2021, 10:15 pm</div><div class='post-message'><p>café ☕</p></div></div>"
+)
+# Bodies the old page cache kept as they came, error pages included
+ODD_PAGES = [
+    "",
+    "  \r\n\t",
+    "<!-- nothing here -->",
+    "<html></html>",
+    POST,
+    f'<?xml version="1.0" encoding="utf-8"?>\n<html><body>{POST}</body></html>',
+    f'<html><head><meta charset="iso-8859-1"></head><body>{POST}</body></html>',
+]
+
+
+@pytest.mark.parametrize("text", ODD_PAGES)
+def test_backends_match_on_odd_pages(text):
+    assert parse.extract(text, "lxml") == parse.extract(text, "html.parser")
+
+
+def test_backends_match_on_forum_pages():
+    forum = syntheticForum(posts=600, seed=3)
+    for url, text in forum.pages():
+        # the same pages as they would come from a server that sends CRLF
+        for page in (text, text.replace("><", ">\r\n<")):
+            assert parse.extract(page, "lxml") == parse.extract(page, "html.parser"), url
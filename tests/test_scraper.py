@@ -0,0 +1,83 @@
+import html
+import datetime
+from bench import new_data, serve_store, localSession
+from models import Category, Topic, Author
+from pagestore import open_store, normalize_url
+from parse import pageRecord
+from scraper import pageWrapper, find_posts, crawl, scrapeTracker, page_number
+from synthetic import syntheticForum, forum_time
+
+URL = "https://apda.online/forum/topic/1/?part=2"
+
+
+def topic_page(*posts):
+    record = pageRecord()
+    record.posts = [("alice", "https://apda.online/profile/alice/", date, content) for date, content in posts]
+    return record
+
+
+def test_refreshed_page_replaces_edited_posts():
+    category = Category("General", "https://apda.online/forum/forum-1/")
+    topic = Topic(category, "A topic", "https://apda.online/forum/topic/1/")
+    data = {"categories": {}, "topics": {topic.load_id: topic}, "posts": {}, "authors": {"deleted": Author("deleted", None)}}
+    find_posts(topic_page(("March 5, 2021, 10:15 pm", "First"), ("March 5, 2021, 11:15 pm", "Second")), data, pageWrapper(URL, topic=topic))
+    find_posts(
+        topic_page(("March 5, 2021, 10:15 pm", "First"), ("March 5, 2021, 11:15 pm", "Second, edited"), ("March 6, 2021, 9:00 am", "Third")),
+        data,
+        pageWrapper(URL, topic=topic, refresh=True),
+    )
+    contents = ["First", "Second, edited", "Third"]
+    assert sorted(p.content for p in data["posts"].values()) == contents
+    assert sorted(p.content for p in topic.posts) == contents
+    assert sorted(p.content for p in data["authors"]["alice"].posts) == contents
+    assert len(topic.pages[URL]) == 3
+
+
+def late_reply(forum, topic, content):
+    # The topic's listing page and last page as they are once `content` has been posted to it, as (url, html) pairs
+    posts = forum.topic_posts(topic)
+    row = f"<a href='{forum.topic_url(topic)}'>{html.escape(forum.topic_title(topic))}</a></div><div class='topic-stats'>{len(posts) - 1} replies"
+    pages = dict(forum.pages())
+    listing = next(url for url, text in pages.items() if row in text)
+    last_page = max((url for url in pages if url.startswith(forum.topic_url(topic))), key=page_number)
+    reply = (
+        "<div class='post-element'><a class='profile-link' href='https://apda.online/profile/debater1/'>debater1</a>"
+        f"<div class='forum-post-date'>{forum_time(datetime.datetime(2025, 6, 1, 12))}</div>"
+        f"<div class='post-message'><p>{content}</p></div></div>"
+    )
+    return (
+        (listing, pages[listing].replace(row, row.replace(f">{len(posts) - 1} replies", f">{len(posts)} replies"))),
+        (last_page, pages[last_page].replace("</div></body>", reply + "</div></body>")),
+    )
+
+
+def test_failed_topic_page_is_fetched_again(tmp_path):
+    forum = syntheticForum(posts=150, seed=5, posts_per_page=5)
+    server_path, cache_path = str(tmp_path / "server.db"), str(tmp_path / "cache.db")
+    forum.write_store(server_path)
+    data = new_data()
+    crawl(None, data, scrapeTracker(), store_path=server_path)
+
+    topic = next(t for t, (_, size) in enumerate(forum.topics) if size > 10)
+    (listing, listing_text), (last_page, last_text) = late_reply(forum, topic, "A late reply")
+    server = serve_store(server_path)
+    try:
+        store = open_store(server_path)
+        store.put(listing, listing_text)
+        with store.lock:
+            store.conn.execute("DELETE FROM pages WHERE url = ?", (normalize_url(last_page),))
+            store.conn.commit()
+        session = localSession(f"http://127.0.0.1:{server.server_port}")
+        tracker = scrapeTracker()
+        crawl(session, data, tracker, store_path=cache_path, refresh=True)
+        assert tracker.failed == [last_page]
+
+        store.put(last_page, last_text)
+        tracker = scrapeTracker()
+        crawl(session, data, tracker, store_path=cache_path, refresh=True)
+        assert not tracker.failed
+        assert "A late reply" in [p.content for p in data["posts"].values()]
+    finally:
+        server.shutdown()
+        open_store(server_path).close()
+        open_store(cache_path).close()